@@ -0,0 +1,232 @@
+import os
+import asyncio
+import threading
+from functools import wraps
+from concurrent.futures import ProcessPoolExecutor
+from scipy.io.wavfile import read, write
+import sender
+import receiver
+import profiles
+import metrics
+
+# ---------------Parameters--------------- #
+
+# The signal processing runs in this many processes, one per core if None, so the event loop never waits for it
+workers = None
+
+executor = None
+lock = threading.Lock()
+
+
+# -----------------Pool----------------- #
+
+def get_executor():
+    """
+    This function returns the pool the signal processing runs in, starting it on first use.
+
+    Returns:
+    Executor: The pool.
+    """
+    global executor
+    with lock:
+        if executor is None:
+            # Compute what every profile needs before the workers are forked, so they inherit it
+            sender.prepare()
+            receiver.prepare()
+            executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+    return executor
+
+
+def shutdown():
+    """
+    This function waits for the running jobs and stops the pool.
+
+    Returns:
+    None
+    """
+    global executor
+    with lock:
+        if executor is not None:
+            executor.shutdown()
+            executor = None
+
+
+async def run(pool, function, *args):
+    """
+    This function runs a function in a pool without blocking the event loop, and brings its metrics back.
+    Cancelling the awaiting task cancels the job if it has not started yet.
+
+    Parameters:
+    pool (Executor): The pool, the shared one if None.
+    function (callable): The function.
+    *args: The arguments of the function.
+
+    Returns:
+    The result of the function.
+    """
+    loop = asyncio.get_running_loop()
+    result, collected = await loop.run_in_executor(pool or get_executor(), metrics.measured, function, *args)
+    metrics.merge(collected)
+    return result
+
+
+def report(progress, stage, done, total):
+    """
+    This function tells a progress callback how far a stage has got.
+
+    Parameters:
+    progress (callable): The callback, called with the stage, the work done and the total work, or None.
+    stage (str): The name of the stage.
+    done (int): The work done.
+    total (int): The total work.
+
+    Returns:
+    None
+    """
+    if progress is not None:
+        progress(stage, done, total)
+
+
+# -----------------Sender----------------- #
+
+async def encode_async(text, carriers=1, profile=0, compression=None, progress=None, pool=None):
+    """
+    This function encodes a text string into the filtered signal that is played to send it, in the pool.
+
+    Parameters:
+    text (str or bytes): The text string, or bytes to send a binary payload.
+    carriers (int): The number of parallel carriers the payload is sent on, ignored if a profile is given.
+    profile (int): The profile the payload is sent with, 0 for the bit_duration and ecc_bytes parameters.
+    compression (str): 'none', 'zlib', 'dictionary' or 'auto', the compression parameter of the payload module if None.
+    progress (callable): Called with the stage, the work done and the total work.
+    pool (Executor): The pool, the shared one if None.
+
+    Returns:
+    array: The filtered signal as int16 samples at the sample rate.
+    """
+    report(progress, 'encode', 0, 1)
+    signal = await run(pool, sender.encode, text, carriers, profile, compression)
+    report(progress, 'encode', 1, 1)
+    return signal
+
+
+async def encode_file_async(text, path, carriers=1, profile=0, compression=None, progress=None, pool=None):
+    """
+    This function encodes a text string and writes its signal to a WAV file, without blocking the event loop.
+
+    Parameters:
+    text (str or bytes): The text string, or bytes to send a binary payload.
+    path (str): The path of the WAV file.
+    carriers (int): The number of parallel carriers the payload is sent on, ignored if a profile is given.
+    profile (int): The profile the payload is sent with, 0 for the bit_duration and ecc_bytes parameters.
+    compression (str): 'none', 'zlib', 'dictionary' or 'auto', the compression parameter of the payload module if None.
+    progress (callable): Called with the stage, the work done and the total work.
+    pool (Executor): The pool, the shared one if None.
+
+    Returns:
+    None
+    """
+    signal = await encode_async(text, carriers, profile, compression, progress, pool)
+
+    # File I/O releases the GIL, a thread is enough
+    with metrics.stage('wav_write', samples=len(signal)):
+        await asyncio.to_thread(write, path, profiles.sample_rate, signal)
+
+
+# -----------------Receiver----------------- #
+
+async def decode_async(data, sr=profiles.sample_rate, progress=None, pool=None):
+    """
+    This function decodes every message sent in an audio signal, the frames being decoded in parallel in the pool.
+    Cancelling the awaiting task cancels the frames not decoded yet.
+
+    Parameters:
+    data (array): The audio data.
+    sr (int): The sample rate of the audio.
+    progress (callable): Called with the stage, the work done and the total work, after the sync and after every frame.
+    pool (Executor): The pool, the shared one if None.
+
+    Returns:
+    list: The received text of each message, or an error message, in order.
+    """
+    # Find the frames first, so the progress can be told frame by frame
+    report(progress, 'sync', 0, 1)
+    segments = await run(pool, receiver.frame_segments, data, sr)
+    report(progress, 'sync', 1, 1)
+
+    tasks = [asyncio.ensure_future(run(pool, receiver.decode_segment, segment, end_sample, sr))
+             for segment, end_sample in segments]
+    try:
+        for done, finished in enumerate(asyncio.as_completed(tasks), 1):
+            await finished
+            report(progress, 'decode', done, len(tasks))
+        return [task.result() for task in tasks]
+    finally:
+        # Drop the frames still waiting if the decoding was cancelled or failed
+        for task in tasks:
+            task.cancel()
+
+
+async def decode_file_async(path, progress=None, pool=None):
+    """
+    This function decodes every message of a WAV file without blocking the event loop.
+
+    Parameters:
+    path (str): The path of the WAV file.
+    progress (callable): Called with the stage, the work done and the total work.
+    pool (Executor): The pool, the shared one if None.
+
+    Returns:
+    list: The received text of each message, or an error message, in order.
+    """
+    # File I/O releases the GIL, a thread is enough
+    with metrics.stage('wav_read'):
+        sr, data = await asyncio.to_thread(read, path)
+    metrics.count('samples_read_total', len(data))
+
+    return await decode_async(data, sr, progress, pool)
+
+
+# -----------------Interface----------------- #
+
+def offloaded(function):
+    """
+    This function wraps a blocking function into a coroutine function running it in the pool, for the interfaces.
+
+    Parameters:
+    function (callable): The function.
+
+    Returns:
+    callable: The coroutine function, taking the same arguments.
+    """
+    @wraps(function)
+    async def wrapper(*args):
+        return await run(None, function, *args)
+
+    return wrapper
+
+
+async def receive_async(progress=None, audio=None):
+    """
+    This function decodes every message of the recorded audio, like receiver.receive, without blocking the event loop.
+
+    Parameters:
+    progress (callable): Called with the stage, the work done and the total work.
+    audio (tuple): The sample rate and the audio data, the recorded audio file is read if None.
+
+    Returns:
+    str: The received texts, one per line.
+    """
+    try:
+        if audio is None:
+            messages = await decode_file_async(receiver.recorded_file, progress)
+        else:
+            sr, data = audio
+            messages = await decode_async(data, sr, progress)
+        if not messages:
+            return "Error: No message found"
+
+        return "\n".join(messages)
+    except Exception as e:
+        # If an error occurs, return an error message
+        return f"Error: {e}"
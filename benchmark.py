@@ -0,0 +1,225 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+import sender
+import receiver
+import profiles
+from filters import butter_bandpass_filter, to_int16
+from multicarrier import max_carriers
+
+# ---------------Parameters--------------- #
+
+# Larger payloads take minutes and several GB of memory, they can still be given with --sizes
+payload_sizes = [10, 100, 1000, 10000]
+bit_durations = [0.007, 0.005, 0.004]
+carrier_counts = [1, 8]
+output_file = 'benchmark.json'
+
+
+# -----------------Pipeline----------------- #
+
+def random_text(size, seed=0):
+    """
+    This function generates a reproducible random printable text.
+
+    Parameters:
+    size (int): The number of characters.
+    seed (int): The seed of the random generator.
+
+    Returns:
+    str: The text.
+    """
+    codes = np.random.default_rng(seed).integers(32, 127, size, dtype=np.uint8)
+    return codes.tobytes().decode('latin-1')
+
+
+@contextmanager
+def bit_duration(duration):
+    """
+    This function sets the symbol duration shared by the sender and the receiver, and restores it afterwards.
+
+    Parameters:
+    duration (float): The duration of one symbol.
+
+    Yields:
+    None
+    """
+    previous = profiles.bit_duration
+    profiles.bit_duration = duration
+    try:
+        yield
+    finally:
+        profiles.bit_duration = previous
+
+
+def run_pipeline(text, carriers):
+    """
+    This function encodes a text and decodes the audio straight away, timing every stage.
+
+    Parameters:
+    text (str): The text to send.
+    carriers (int): The number of parallel carriers.
+
+    Returns:
+    tuple: The received text, the number of audio samples and the time of every stage in seconds.
+    """
+    timings = {}
+
+    def timed(stage, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    # Sender
+    bits = timed('text_to_binary', sender.text_to_binary, text, 'none')
+    encoded_bits = timed('rs_encode', sender.encode_rs, bits, profiles.ecc_bytes)
+    signal = timed('synthesis', sender.frame_to_signal, encoded_bits, carriers)
+    audio = timed('sender_filter', lambda: to_int16(butter_bandpass_filter(signal, profiles.sample_rate, profiles.filter_band), overwrite=True))
+
+    # Receiver, fed with the sender output directly instead of a sound card
+    sr = profiles.sample_rate
+    filtered = timed('receiver_filter', butter_bandpass_filter, audio, sr, profiles.filter_band)
+    start_sample, end_sample, confidence = timed('sync', receiver.frame_analyse, filtered, sr)
+    demodulated = timed('demodulation', receiver.demodulate_frame_soft, filtered, start_sample, end_sample, sr)
+    manchester, confidence = timed('manchester', receiver.manchester_soft_decoding, demodulated)
+    length = len(manchester) // 8 * 8
+    byte_confidence = confidence[:length].reshape(-1, 8).min(axis=1)
+    decoded_bits = timed('rs_decode', receiver.decode_rs, manchester[:length], profiles.ecc_bytes, byte_confidence)
+    received = timed('binary_to_text', receiver.binary_to_text, decoded_bits)
+
+    return received, len(audio), timings
+
+
+def peak_memory(text, carriers):
+    """
+    This function measures the peak memory allocated while running the pipeline once.
+
+    Parameters:
+    text (str): The text to send.
+    carriers (int): The number of parallel carriers.
+
+    Returns:
+    int: The peak memory in bytes.
+    """
+    tracemalloc.start()
+    try:
+        run_pipeline(text, carriers)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# -----------------Benchmark----------------- #
+
+def benchmark(size, duration, carriers, repeat=3, memory=True):
+    """
+    This function benchmarks one payload size, symbol duration and number of carriers.
+
+    Parameters:
+    size (int): The payload size in bytes.
+    duration (float): The duration of one symbol.
+    carriers (int): The number of parallel carriers, limited to what fits at this duration.
+    repeat (int): The number of timed runs, the fastest is kept.
+    memory (bool): Whether to measure the peak memory in an extra run.
+
+    Returns:
+    dict: The results.
+    """
+    carriers = min(carriers, max_carriers(profiles.sample_rate, duration))
+    text = random_text(size)
+
+    with bit_duration(duration):
+        # Keep the fastest run of every stage, the others are slowed down by the rest of the machine
+        best = {}
+        for _ in range(repeat):
+            received, n_samples, timings = run_pipeline(text, carriers)
+            for stage, seconds in timings.items():
+                best[stage] = min(seconds, best.get(stage, seconds))
+
+        peak = peak_memory(text, carriers) if memory else None
+
+    encode_time = sum(best[stage] for stage in ('text_to_binary', 'rs_encode', 'synthesis', 'sender_filter'))
+    decode_time = sum(best.values()) - encode_time
+    payload_bits = 8 * size
+
+    return {
+        'payload_bytes': size,
+        'bit_duration': duration,
+        'carriers': carriers,
+        'decoded': received == text,
+        'samples': n_samples,
+        'audio_seconds': n_samples / profiles.sample_rate,
+        'air_bits_per_second': payload_bits * profiles.sample_rate / n_samples,
+        'encode_seconds': encode_time,
+        'decode_seconds': decode_time,
+        'encode_samples_per_second': n_samples / encode_time,
+        'decode_samples_per_second': n_samples / decode_time,
+        'payload_bits_per_second': payload_bits / (encode_time + decode_time),
+        'peak_memory_bytes': peak,
+        'stages': best,
+    }
+
+
+def environment():
+    """
+    This function describes the code and the machine the benchmark ran on, so results can be compared.
+
+    Returns:
+    dict: The description.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+    }
+
+
+def main():
+    """
+    This function runs the benchmark from the command line and writes the results to a JSON file.
+
+    Returns:
+    None
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the encode and decode pipeline without a sound card.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=payload_sizes, help="payload sizes in bytes")
+    parser.add_argument('--durations', type=float, nargs='+', default=bit_durations, help="symbol durations in seconds")
+    parser.add_argument('--carriers', type=int, nargs='+', default=carrier_counts, help="numbers of carriers")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per configuration")
+    parser.add_argument('--no-memory', action='store_true', help="skip the peak memory measurement")
+    parser.add_argument('--output', default=output_file, help="JSON file the results are written to")
+    args = parser.parse_args()
+
+    results = []
+    for duration in args.durations:
+        for carriers in args.carriers:
+            for size in args.sizes:
+                result = benchmark(size, duration, carriers, args.repeat, not args.no_memory)
+                results.append(result)
+                print(f"{size:>7} B  {duration * 1000:.1f} ms  {result['carriers']:>2} carriers  "
+                      f"encode {result['encode_seconds']:.3f} s  decode {result['decode_seconds']:.3f} s  "
+                      f"{result['decode_samples_per_second'] / 1e6:.1f} Msamples/s  "
+                      f"{'ok' if result['decoded'] else 'FAILED'}")
+
+    with open(args.output, 'w') as file:
+        json.dump({'environment': environment(), 'results': results}, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,430 @@
+import argparse
+import itertools
+import json
+import time
+from contextlib import contextmanager
+import numpy as np
+from scipy import signal
+from concurrent.futures import ProcessPoolExecutor
+import sender
+import receiver
+import profiles
+import filters
+from filters import butter_bandpass_filter, to_int16
+from multicarrier import max_carriers
+from profiles import profile_settings
+
+# ---------------Parameters--------------- #
+
+# Settings of the modem, applied to both the sender and the receiver of a trial
+modem_defaults = {
+    'payload_bytes': 100,
+    'bit_duration': 0.007,
+    'carriers': 1,
+    'amplitude_scaling_factor': 15.0,
+    'ecc_bytes': 20,
+    'profile': 0,
+}
+
+# Impairments of the acoustic channel, the defaults leave the signal untouched
+channel_defaults = {
+    'snr_db': None,
+    'echoes': (),
+    'mic_band': None,
+    'drift_ppm': 0.0,
+    'clip_level': None,
+}
+
+# Silence around the sender output, so echoes and a late clock do not push the frame out of the recording
+guard_duration = 0.25
+mic_order = 2
+output_file = 'channel.json'
+
+
+# -----------------Channel----------------- #
+
+def add_echoes(data, sr, echoes):
+    """
+    This function simulates multipath propagation by adding delayed and attenuated copies of the signal.
+
+    Parameters:
+    data (array): The audio data.
+    sr (int): The sample rate of the audio.
+    echoes (iterable): The (delay in seconds, gain) of every reflection, the direct path has a gain of 1.
+
+    Returns:
+    array: The audio data received through all the paths, with the same length.
+    """
+    echoes = list(echoes)
+    if not echoes:
+        return data
+
+    # Build the impulse response of the room
+    delays = [int(round(delay * sr)) for delay, _ in echoes]
+    impulse_response = np.zeros(max(delays) + 1)
+    impulse_response[0] = 1.0
+    for delay, (_, gain) in zip(delays, echoes):
+        impulse_response[delay] += gain
+
+    return signal.fftconvolve(data, impulse_response)[:len(data)]
+
+
+def add_noise(data, snr_db, rng, frame=slice(None)):
+    """
+    This function adds white Gaussian noise to a signal.
+
+    Parameters:
+    data (array): The audio data.
+    snr_db (float): The ratio between the power of the signal and the power of the noise over the whole band, in dB.
+    rng (Generator): The random generator the noise is drawn from.
+    frame (slice): The part of the data the power of the signal is measured on.
+
+    Returns:
+    array: The noisy audio data.
+    """
+    signal_power = np.mean(np.square(data[frame], dtype=np.float64))
+    noise_power = signal_power / 10 ** (snr_db / 10)
+
+    return data + rng.normal(0.0, np.sqrt(noise_power), len(data))
+
+
+def microphone(data, sr, band, order=mic_order):
+    """
+    This function simulates the frequency response of a microphone that only picks up a band of frequencies.
+
+    Parameters:
+    data (array): The audio data.
+    sr (int): The sample rate of the audio.
+    band (tuple): The low and high cutoff frequencies of the microphone in Hz.
+    order (int): The order of the roll-off outside the band.
+
+    Returns:
+    array: The audio data as recorded by the microphone.
+    """
+    return butter_bandpass_filter(data, sr, tuple(band), order)
+
+
+def clock_drift(data, drift_ppm):
+    """
+    This function simulates a receiver whose sample clock differs from the sender's.
+
+    Parameters:
+    data (array): The audio data at the sample rate of the sender.
+    drift_ppm (float): How much faster the clock of the receiver runs, in parts per million.
+
+    Returns:
+    array: The audio data as sampled by the receiver.
+    """
+    if not drift_ppm:
+        return data
+
+    # Resample the whole recording, the spectrum stays exact as the signal is band-limited
+    return signal.resample(data, int(round(len(data) * (1 + drift_ppm * 1e-6))))
+
+
+def clip(data, clip_level, frame=slice(None)):
+    """
+    This function simulates an overdriven microphone or converter that saturates.
+
+    Parameters:
+    data (array): The audio data.
+    clip_level (float): The level the signal saturates at, as a fraction of its peak.
+    frame (slice): The part of the data the peak is measured on.
+
+    Returns:
+    array: The clipped audio data.
+    """
+    level = clip_level * np.max(np.abs(data[frame]))
+    return np.clip(data, -level, level)
+
+
+def simulate(data, sr, rng, snr_db=None, echoes=(), mic_band=None, drift_ppm=0.0, clip_level=None, frame=slice(None)):
+    """
+    This function sends audio data through a simulated acoustic channel.
+    The impairments are applied in the order the sound meets them: the room, the ambient noise,
+    the microphone, the clock of the receiver and the saturation of its converter.
+
+    Parameters:
+    data (array): The audio data played by the sender.
+    sr (int): The sample rate of the audio.
+    rng (Generator): The random generator of the noise.
+    snr_db (float): The signal to noise ratio in dB, None for no noise.
+    echoes (iterable): The (delay in seconds, gain) of every reflection.
+    mic_band (tuple): The band picked up by the microphone in Hz, None for a flat response.
+    drift_ppm (float): The clock offset of the receiver in parts per million.
+    clip_level (float): The saturation level as a fraction of the peak, None for no clipping.
+    frame (slice): The part of the data holding the frame, used to measure its power and peak.
+
+    Returns:
+    array: The audio data recorded by the receiver, as float64.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    data = add_echoes(data, sr, echoes)
+    if snr_db is not None:
+        data = add_noise(data, snr_db, rng, frame)
+    if mic_band is not None:
+        data = microphone(data, sr, mic_band)
+    data = clock_drift(data, drift_ppm)
+    if clip_level is not None:
+        data = clip(data, clip_level, frame)
+    return data
+
+
+# -----------------Trial----------------- #
+
+@contextmanager
+def configured(settings):
+    """
+    This function applies modem settings to the profile shared by the sender and the receiver, and restores them afterwards.
+
+    Parameters:
+    settings (dict): The settings, with the keys of modem_defaults.
+
+    Yields:
+    None
+    """
+    previous = {}
+    try:
+        for name in ('bit_duration', 'amplitude_scaling_factor', 'ecc_bytes'):
+            previous[name] = getattr(profiles, name)
+            setattr(profiles, name, settings[name])
+        yield
+    finally:
+        # Put back only what was replaced, even if a setting was missing
+        for name, value in previous.items():
+            setattr(profiles, name, value)
+
+
+def check_carriers(settings, sr=profiles.sample_rate):
+    """
+    This function checks that the carriers of a trial fit in the band at its symbol duration.
+
+    Parameters:
+    settings (dict): The settings, with the keys of modem_defaults.
+    sr (int): The sample rate of the audio.
+
+    Returns:
+    None
+    """
+    # The profiles pick their own carriers, limited to what fits
+    if settings['profile'] != 0:
+        return
+
+    limit = max_carriers(sr, settings['bit_duration'])
+    if settings['carriers'] > limit:
+        raise ValueError(f"{settings['carriers']} carriers do not fit in the band at {settings['bit_duration'] * 1000:g} ms "
+                         f"symbols, at most {limit} do")
+
+
+def count_errors(received, sent):
+    """
+    This function counts the bits that differ between two sequences, missing or extra bits being errors.
+
+    Parameters:
+    received (array): The received bits.
+    sent (array): The sent bits.
+
+    Returns:
+    int: The number of errors.
+    """
+    length = min(len(received), len(sent))
+    return int(np.count_nonzero(received[:length] != sent[:length])) + abs(len(received) - len(sent))
+
+
+def run_trial(job):
+    """
+    This function sends one random payload through the simulated channel and measures how it was received.
+
+    Parameters:
+    job (tuple): The settings of the modem and the channel, and the seed of the trial.
+
+    Returns:
+    dict: The result of the trial.
+    """
+    settings, seed = job
+    rng = np.random.default_rng(seed)
+    sr = profiles.sample_rate
+    check_carriers(settings, sr)
+    with configured(settings):
+        profile = settings['profile']
+        duration, ecc, carriers = profile_settings(profile, settings['carriers'], sr)
+
+        # Encode a random payload, keeping the symbols that go on air
+        bits = np.unpackbits(rng.integers(0, 256, settings['payload_bytes'], dtype=np.uint8))
+        encoded_bits = sender.encode_rs(bits, ecc)
+        symbols = sender.manchester_symbols(encoded_bits)
+        if carriers > 1:
+            symbols = sender.carrier_symbols(symbols, carriers).reshape(-1)
+        audio = to_int16(butter_bandpass_filter(sender.frame_to_signal(encoded_bits, carriers, profile), sr, profiles.filter_band), overwrite=True)
+
+        # Send it through the channel, between guard silences
+        guard = np.zeros(int(sr * guard_duration))
+        silence_length = int(sr * profiles.silence_duration)
+        frame = slice(len(guard) + silence_length, len(guard) + len(audio) - silence_length)
+        channel = {name: settings[name] for name in channel_defaults}
+        recording = simulate(np.concatenate((guard, audio, guard)), sr, rng, frame=frame, **channel)
+
+        # Hand the recording over in the precision the receiver works in, like a sound card delivering float32 samples
+        recording = recording.astype(filters.working_dtype, copy=False)
+
+        # Receive it, one stage after the other so a failure still tells how far it got
+        result = {'detected': False, 'symbol_errors': len(symbols), 'bit_errors': len(bits), 'decoded': False}
+        filtered = butter_bandpass_filter(recording, sr, profiles.filter_band)
+        try:
+            start_sample, end_sample, confidence = receiver.frame_analyse(filtered, sr)
+            result['measured_snr_db'] = float(receiver.estimate_snr(filtered, start_sample, sr).min())
+            demodulated = receiver.demodulate_frame_soft(filtered, start_sample, end_sample, sr)
+        except ValueError:
+            pass
+        else:
+            result['detected'] = True
+            result['confidence'] = float(confidence)
+            result['symbol_errors'] = count_errors(demodulated > 0, symbols)
+            try:
+                decoded_bits = receiver.decode_soft(demodulated, ecc)
+            except ValueError:
+                pass
+            else:
+                result['bit_errors'] = count_errors(decoded_bits, bits)
+                result['decoded'] = result['bit_errors'] == 0
+
+        result.update(symbols=len(symbols), bits=len(bits), bit_duration=duration, ecc_bytes=ecc, carriers=carriers,
+                      air_seconds=len(audio) / sr)
+        return result
+
+
+# -----------------Sweep----------------- #
+
+def grid(**values):
+    """
+    This function builds every combination of settings to sweep.
+
+    Parameters:
+    **values: A list of values for each setting of modem_defaults and channel_defaults.
+
+    Returns:
+    list: The settings of every combination, completed with the defaults.
+    """
+    names = list(values)
+    return [{**modem_defaults, **channel_defaults, **dict(zip(names, combination))}
+            for combination in itertools.product(*(values[name] for name in names))]
+
+
+def summarize(settings, results):
+    """
+    This function sums up the trials of one combination of settings.
+
+    Parameters:
+    settings (dict): The settings of the trials.
+    results (list): The results of the trials.
+
+    Returns:
+    dict: The settings with the detection and decoding rates, the error rates and the goodput.
+    """
+    trials = len(results)
+    symbols = sum(result['symbols'] for result in results)
+    bits = sum(result['bits'] for result in results)
+    decoded = sum(result['decoded'] for result in results)
+
+    # Only the payloads decoded without error count towards the goodput
+    air_seconds = sum(result['air_seconds'] for result in results)
+    goodput = decoded * 8 * settings['payload_bytes'] / air_seconds
+
+    # The SNR the receiver measured, the one profiles are picked from
+    measured = [result['measured_snr_db'] for result in results if 'measured_snr_db' in result]
+
+    return dict(settings,
+                echoes=[list(echo) for echo in settings['echoes']],
+                bit_duration=results[0]['bit_duration'],
+                ecc_bytes=results[0]['ecc_bytes'],
+                carriers=results[0]['carriers'],
+                trials=trials,
+                detection_rate=sum(result['detected'] for result in results) / trials,
+                frame_success_rate=decoded / trials,
+                symbol_error_rate=sum(result['symbol_errors'] for result in results) / symbols,
+                bit_error_rate=sum(result['bit_errors'] for result in results) / bits,
+                goodput_bits_per_second=goodput,
+                measured_snr_db=float(np.median(measured)) if measured else None)
+
+
+def sweep(configurations, trials=20, workers=None, seed=0):
+    """
+    This function runs Monte-Carlo trials of every configuration across a process pool.
+
+    Parameters:
+    configurations (list): The settings to evaluate, as built by grid.
+    trials (int): The number of random payloads and noise draws per configuration.
+    workers (int): The number of processes, 1 runs every trial in this process.
+    seed (int): The seed the seeds of the trials are derived from.
+
+    Returns:
+    list: The summary of every configuration, in the same order.
+    """
+    # Refuse a configuration that cannot be sent before running any trial
+    for settings in configurations:
+        check_carriers(settings)
+
+    # Give every trial its own seed so the results do not depend on which process ran it
+    seeds = np.random.SeedSequence(seed).generate_state(len(configurations) * trials)
+    jobs = [(settings, int(seeds[index * trials + trial]))
+            for index, settings in enumerate(configurations) for trial in range(trials)]
+
+    if workers == 1:
+        results = [run_trial(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run_trial, jobs, chunksize=max(1, trials // 4)))
+
+    return [summarize(settings, results[index * trials:(index + 1) * trials])
+            for index, settings in enumerate(configurations)]
+
+
+def main():
+    """
+    This function runs a sweep from the command line and writes the results to a JSON file.
+
+    Returns:
+    None
+    """
+    parser = argparse.ArgumentParser(description="Measure the error rates and goodput of the modem over a simulated acoustic channel.")
+    parser.add_argument('--size', type=int, default=modem_defaults['payload_bytes'], help="payload size in bytes")
+    parser.add_argument('--durations', type=float, nargs='+', default=[modem_defaults['bit_duration']], help="symbol durations in seconds")
+    parser.add_argument('--carriers', type=int, nargs='+', default=[modem_defaults['carriers']], help="numbers of carriers")
+    parser.add_argument('--amplitudes', type=float, nargs='+', default=[modem_defaults['amplitude_scaling_factor']], help="amplitude scaling factors")
+    parser.add_argument('--ecc', type=int, nargs='+', default=[modem_defaults['ecc_bytes']], help="Reed-Solomon ECC bytes per block")
+    parser.add_argument('--profiles', type=int, nargs='+', default=[modem_defaults['profile']], help="profiles, 0 for the settings above")
+    parser.add_argument('--snr', type=float, nargs='+', default=[0.0, 5.0, 10.0, 20.0], help="signal to noise ratios in dB")
+    parser.add_argument('--drift', type=float, nargs='+', default=[0.0], help="receiver clock offsets in ppm")
+    parser.add_argument('--clip', type=float, nargs='+', default=[None], help="clipping levels as a fraction of the peak")
+    parser.add_argument('--echo', type=float, nargs=2, action='append', metavar=('DELAY', 'GAIN'), help="add a reflection, in seconds and relative gain")
+    parser.add_argument('--mic-band', type=float, nargs=2, default=None, metavar=('LOW', 'HIGH'), help="band picked up by the microphone in Hz")
+    parser.add_argument('--trials', type=int, default=20, help="trials per configuration")
+    parser.add_argument('--workers', type=int, default=None, help="number of processes")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the random payloads and noise")
+    parser.add_argument('--output', default=output_file, help="JSON file the results are written to")
+    args = parser.parse_args()
+
+    configurations = grid(payload_bytes=[args.size], bit_duration=args.durations, carriers=args.carriers,
+                          amplitude_scaling_factor=args.amplitudes, ecc_bytes=args.ecc, profile=args.profiles, snr_db=args.snr,
+                          drift_ppm=args.drift, clip_level=args.clip, echoes=[tuple(map(tuple, args.echo or ()))],
+                          mic_band=[tuple(args.mic_band) if args.mic_band else None])
+
+    start = time.perf_counter()
+    try:
+        results = sweep(configurations, args.trials, args.workers, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    for result in results:
+        print(f"profile {result['profile']}  {result['bit_duration'] * 1000:.1f} ms  {result['carriers']:>2} carriers  "
+              f"ecc {result['ecc_bytes']:>2}  amplitude {result['amplitude_scaling_factor']:g}  "
+              f"snr {result['snr_db']:g} dB  drift {result['drift_ppm']:g} ppm  "
+              f"SER {result['symbol_error_rate']:.2e}  BER {result['bit_error_rate']:.2e}  "
+              f"frames {result['frame_success_rate']:.0%}  goodput {result['goodput_bits_per_second']:.1f} bit/s  "
+              f"measured snr {result['measured_snr_db'] if result['measured_snr_db'] is not None else float('nan'):.1f} dB")
+
+    with open(args.output, 'w') as file:
+        json.dump({'seconds': time.perf_counter() - start, 'trials': args.trials, 'results': results}, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
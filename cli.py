@@ -0,0 +1,206 @@
+import io
+import sys
+import json
+import argparse
+
+# ---------------Parameters--------------- #
+
+# Raw PCM is signed 16-bit little-endian mono, at this sample rate unless told otherwise
+raw_sample_rate = 44100
+
+# Raw PCM is decoded as it arrives, this many seconds at a time
+raw_block_duration = 0.5
+
+compressions = ['none', 'zlib', 'dictionary', 'auto']
+
+
+# -----------------Audio----------------- #
+
+def raw_blocks(stream, block_size):
+    """
+    This function reads raw PCM from a stream block by block, so a pipe is decoded while it is still being written.
+
+    Parameters:
+    stream (file): The binary stream.
+    block_size (int): The number of samples in each block.
+
+    Yields:
+    array: The next block of samples.
+    """
+    # Import numpy here so the command line answers --help without loading it
+    import numpy as np
+
+    while True:
+        data = stream.read(2 * block_size)
+        if not data:
+            return
+
+        # A sample split at the end of the stream is dropped
+        yield np.frombuffer(data[:len(data) // 2 * 2], dtype='<i2')
+
+
+def wav_bytes(sr, signal):
+    """
+    This function writes a signal to a WAV file held in memory, as WAV files cannot be written to a pipe directly.
+
+    Parameters:
+    sr (int): The sample rate of the audio.
+    signal (array): The samples.
+
+    Returns:
+    bytes: The content of the WAV file.
+    """
+    from scipy.io.wavfile import write
+
+    buffer = io.BytesIO()
+    write(buffer, sr, signal)
+    return buffer.getvalue()
+
+
+# -----------------Send----------------- #
+
+def send(argv=None):
+    """
+    This function encodes a message read from stdin, or given as argument, into audio written to stdout.
+
+    Parameters:
+    argv (list): The arguments, those of the command line if None.
+
+    Returns:
+    int: The exit status.
+    """
+    parser = argparse.ArgumentParser(prog='acoustic-send', description="Encode a message read from stdin into audio written to stdout.")
+    parser.add_argument('message', nargs='?', help="text to send, read from stdin if not given")
+    parser.add_argument('-o', '--output', default='-', help="file the audio is written to, - for stdout")
+    parser.add_argument('--bytes', action='store_true', help="send stdin as binary data instead of UTF-8 text")
+    parser.add_argument('--raw', action='store_true', help="write raw signed 16-bit little-endian PCM instead of WAV")
+    parser.add_argument('--carriers', type=int, default=1, help="number of carriers")
+    parser.add_argument('--profile', default='0', help="profile number or name, 0 for the default settings")
+    parser.add_argument('--snr', type=float, default=None, help="pick the fastest profile for this SNR measured by the receiver")
+    parser.add_argument('--compression', choices=compressions, default=None, help="payload compression, auto by default")
+    args = parser.parse_args(argv)
+
+    # Read the message
+    if args.message is not None:
+        message = args.message.encode('utf-8') if args.bytes else args.message
+    else:
+        data = sys.stdin.buffer.read()
+        message = data if args.bytes else data.decode('utf-8')
+
+    # Import the modem only now, so --help and argument errors answer at once
+    import sender
+    import profiles
+    from profiles import profile_table, select_profile
+
+    # Find the profile from its number or its name
+    names = {settings['name']: number for number, settings in profile_table.items()}
+    try:
+        profile = select_profile(args.snr) if args.snr is not None else names.get(args.profile) or int(args.profile)
+        signal = sender.encode(message, args.carriers, profile, args.compression)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    content = signal.astype('<i2', copy=False).tobytes() if args.raw else wav_bytes(profiles.sample_rate, signal)
+    if args.output == '-':
+        sys.stdout.buffer.write(content)
+        sys.stdout.buffer.flush()
+    else:
+        with open(args.output, 'wb') as file:
+            file.write(content)
+
+    return 0
+
+
+# -----------------Receive----------------- #
+
+def recv(argv=None):
+    """
+    This function decodes every message of audio read from stdin, or from a file, and writes them to stdout.
+
+    Parameters:
+    argv (list): The arguments, those of the command line if None.
+
+    Returns:
+    int: The exit status, 0 if at least one message was decoded.
+    """
+    parser = argparse.ArgumentParser(prog='acoustic-recv', description="Decode the messages of audio read from stdin and write them to stdout.")
+    parser.add_argument('input', nargs='?', default='-', help="WAV or raw PCM file, - for stdin")
+    parser.add_argument('--raw', action='store_true', help="read raw signed 16-bit little-endian mono PCM instead of WAV")
+    parser.add_argument('--rate', type=int, default=raw_sample_rate, help="sample rate of raw PCM")
+    parser.add_argument('--bytes', action='store_true', help="write the payloads as binary data instead of text lines")
+    parser.add_argument('--report', action='store_true', help="write a JSON report per frame, with its SNR and profile")
+    parser.add_argument('--workers', type=int, default=1, help="processes decoding the frames of a WAV file")
+    args = parser.parse_args(argv)
+
+    # Import the modem only now, so --help and argument errors answer at once
+    import receiver
+    from scipy.io.wavfile import read
+
+    stream = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    try:
+        if args.raw:
+            # Decode raw PCM as it arrives
+            sr = args.rate
+            blocks = raw_blocks(stream, max(int(sr * raw_block_duration), 1))
+        elif args.input != '-' and not args.report:
+            # Scan WAV files memory-mapped, so long recordings do not need to fit in memory
+            sr, blocks = None, None
+        else:
+            # A WAV file on stdin has to be read whole, as it cannot be memory-mapped
+            sr, data = read(io.BytesIO(stream.read()))
+            blocks = [data]
+
+        if args.report:
+            # Measure the frames, the whole capture is needed to find the noise before each of them
+            import numpy as np
+            data = np.concatenate([receiver.first_channel(block) for block in blocks])
+            frames = receiver.analyse(data, sr)
+            for frame in frames:
+                print(json.dumps(frame), flush=True)
+            return 0 if any(not frame['text'].startswith("Error:") for frame in frames) else 1
+
+        if blocks is None:
+            messages = receiver.scan(args.input, workers=args.workers, binary=args.bytes)
+        else:
+            messages = receiver.stream_receive(blocks, sr, binary=args.bytes)
+
+        decoded = 0
+        for message in messages:
+            if isinstance(message, str) and message.startswith("Error:"):
+                print(message, file=sys.stderr, flush=True)
+                continue
+
+            decoded += 1
+            if args.bytes:
+                sys.stdout.buffer.write(message)
+                sys.stdout.buffer.flush()
+            else:
+                print(message, flush=True)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+    return 0 if decoded else 1
+
+
+def main():
+    """
+    This function runs `python cli.py send` or `python cli.py recv`, for shells without the acoustic-send and acoustic-recv scripts.
+
+    Returns:
+    None
+    """
+    commands = {'send': send, 'recv': recv}
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print("Usage: python cli.py send|recv [options], see --help of each", file=sys.stderr)
+        sys.exit(2)
+
+    sys.exit(commands[sys.argv[1]](sys.argv[2:]))
+
+
+if __name__ == '__main__':
+    main()
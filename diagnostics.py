@@ -0,0 +1,189 @@
+import os
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ---------------Parameters--------------- #
+
+# Diagnostics are off unless enabled here or with the ACOUSTIC_DIAGNOSTICS environment variable set to 1, true, yes or on
+enabled = os.environ.get('ACOUSTIC_DIAGNOSTICS', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+# The plots are written to this directory, set here or with the ACOUSTIC_DIAGNOSTICS_DIR environment variable
+output_dir = os.environ.get('ACOUSTIC_DIAGNOSTICS_DIR') or 'diagnostics'
+
+executor = None
+counter = itertools.count()
+lock = threading.Lock()
+
+
+# -----------------Control----------------- #
+
+def enable(directory=None):
+    """
+    This function turns the diagnostics on.
+
+    Parameters:
+    directory (str): The directory the plots are written to, output_dir if None.
+
+    Returns:
+    None
+    """
+    global enabled, output_dir
+    if directory is not None:
+        output_dir = directory
+    enabled = True
+
+
+def disable():
+    """
+    This function turns the diagnostics off. Plots already submitted are still written.
+
+    Returns:
+    None
+    """
+    global enabled
+    enabled = False
+
+
+def submit(function, *args):
+    """
+    This function renders a plot in the background so decoding does not wait for it.
+
+    Parameters:
+    function (callable): The function rendering the plot.
+    *args: The arguments of the function.
+
+    Returns:
+    Future: The pending plot, or None if the diagnostics are off.
+    """
+    global executor
+    if not enabled:
+        return None
+
+    with lock:
+        # Start a single worker on first use, matplotlib is not safe to use from several threads
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='diagnostics')
+
+        # Give every plot a unique file name
+        path = os.path.join(output_dir, f"{os.getpid()}-{next(counter):05d}")
+
+    return executor.submit(function, path, *args)
+
+
+def new_figure():
+    """
+    This function creates a figure that is drawn off screen, without pyplot.
+
+    Returns:
+    Figure: The figure.
+    """
+    # Import matplotlib here so it is never loaded while the diagnostics are off
+    from matplotlib.figure import Figure
+
+    return Figure(figsize=(10, 5))
+
+
+# -----------------Plots----------------- #
+
+def render_spectrogram(path, data, sr, start_sample, end_sample):
+    """
+    This function writes the spectrogram of audio data to a PNG file, marking the detected frame.
+
+    Parameters:
+    path (str): The path of the file, without extension.
+    data (array): The filtered audio data.
+    sr (int): The sample rate of the audio.
+    start_sample (int): The index of the first sample after the start flag.
+    end_sample (int): The index of the first sample of the end flag.
+
+    Returns:
+    str: The path of the PNG file.
+    """
+    from scipy import signal
+
+    # Calculate the spectrogram of the audio data
+    f, t, sxx = signal.spectrogram(data, sr, nperseg=256, noverlap=128)
+
+    # Plot the spectrogram and the limits of the frame
+    figure = new_figure()
+    axes = figure.subplots()
+    axes.pcolormesh(t, f, sxx, shading="gouraud")
+    axes.axvline(start_sample / sr, color='white', linestyle='--')
+    axes.axvline(end_sample / sr, color='white', linestyle='--')
+    axes.set_xlabel("Time [s]")
+    axes.set_ylabel("Frequency [Hz]")
+    axes.set_title("Spectrogram of the signal")
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    figure.savefig(path + '-spectrogram.png')
+    return path + '-spectrogram.png'
+
+
+def render_energies(path, low, high):
+    """
+    This function writes the tone energies of every symbol to a PNG file, over time and against each other.
+
+    Parameters:
+    path (str): The path of the file, without extension.
+    low (array): The energy of the low frequency of every symbol, with one column per carrier.
+    high (array): The energy of the high frequency of every symbol, with one column per carrier.
+
+    Returns:
+    str: The path of the PNG file.
+    """
+    import numpy as np
+
+    low = np.asarray(low).reshape(len(low), -1)
+    high = np.asarray(high).reshape(len(high), -1)
+
+    figure = new_figure()
+    timeline, constellation = figure.subplots(1, 2)
+
+    # Plot the share of the high frequency in every symbol, 0 is a clear 0 and 1 a clear 1
+    share = high / np.maximum(low + high, np.finfo(float).tiny)
+    timeline.plot(share, '.', markersize=2)
+    timeline.set_xlabel("Symbol")
+    timeline.set_ylabel("High / (low + high) energy")
+    timeline.set_ylim(0, 1)
+
+    # Plot the low frequency energy against the high frequency energy, the symbols should form two clusters
+    constellation.scatter(low.reshape(-1), high.reshape(-1), s=2)
+    constellation.set_xscale('log')
+    constellation.set_yscale('log')
+    constellation.set_xlabel("Low frequency energy")
+    constellation.set_ylabel("High frequency energy")
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    figure.savefig(path + '-energies.png')
+    return path + '-energies.png'
+
+
+def spectrogram(data, sr, start_sample, end_sample):
+    """
+    This function plots the spectrogram of a frame in the background if the diagnostics are on.
+
+    Parameters:
+    data (array): The filtered audio data.
+    sr (int): The sample rate of the audio.
+    start_sample (int): The index of the first sample after the start flag.
+    end_sample (int): The index of the first sample of the end flag.
+
+    Returns:
+    Future: The pending plot, or None if the diagnostics are off.
+    """
+    return submit(render_spectrogram, data, sr, start_sample, end_sample)
+
+
+def energies(low, high):
+    """
+    This function plots the tone energies of a frame in the background if the diagnostics are on.
+
+    Parameters:
+    low (array): The energy of the low frequency of every symbol.
+    high (array): The energy of the high frequency of every symbol.
+
+    Returns:
+    Future: The pending plot, or None if the diagnostics are off.
+    """
+    return submit(render_energies, low, high)
@@ -0,0 +1,163 @@
+import numpy as np
+from functools import lru_cache
+from scipy.signal import butter, sosfilt, sosfiltfilt
+import metrics
+
+# ---------------Parameters--------------- #
+
+filter_order = 5
+cache_size = 32
+
+# Samples are synthesised, filtered and demodulated in this floating point type, they are int16 only in WAV files and on the
+# sound card. float32 halves the memory and bandwidth of float64 and keeps the precision of int16 audio many times over.
+working_dtype = np.float32
+
+# Range of the int16 samples written to WAV files
+int16_min = np.iinfo(np.int16).min
+int16_max = np.iinfo(np.int16).max
+
+
+# -----------------Design----------------- #
+
+@lru_cache(maxsize=cache_size)
+def butter_bandpass(sr, band, order=filter_order):
+    """
+    This function designs a Butterworth bandpass filter as second-order sections.
+    Designs are cached, so each (sr, band, order) is only designed once.
+
+    Parameters:
+    sr (int): The sample rate of the audio.
+    band (tuple): The low and high cutoff frequencies in Hz.
+    order (int): The order of the filter.
+
+    Returns:
+    array: A read-only array of second-order sections.
+    """
+    # Design the Butterworth bandpass filter directly in Hz
+    sos = butter(order, band, btype='band', fs=sr, output='sos')
+
+    # The design is shared between calls, so protect it from modification
+    sos.setflags(write=False)
+    return sos
+
+
+def filter_dtype(data):
+    """
+    This function returns the floating point type the filter uses for given data.
+
+    Parameters:
+    data (array): The audio data.
+
+    Returns:
+    dtype: float64 for float64 data, otherwise the working_dtype parameter.
+    """
+    return np.float64 if data.dtype == np.float64 else working_dtype
+
+
+def initial_state(sr, band, order=filter_order, dtype=np.float64):
+    """
+    This function returns a zero filter state, used before the first chunk of a stream.
+
+    Parameters:
+    sr (int): The sample rate of the audio.
+    band (tuple): The low and high cutoff frequencies in Hz.
+    order (int): The order of the filter.
+    dtype (dtype): The floating point type of the state.
+
+    Returns:
+    array: The filter state.
+    """
+    sos = butter_bandpass(sr, band, order)
+    return np.zeros((sos.shape[0], 2), dtype=dtype)
+
+
+# -----------------Filter----------------- #
+
+def butter_bandpass_filter(data, sr, band, order=filter_order, zi=None, zero_phase=False):
+    """
+    This function applies the Butterworth bandpass filter to a given data.
+    float64 data is filtered in float64, any other data, int16 samples included, in working_dtype.
+
+    Parameters:
+    data (array): The audio data to be filtered.
+    sr (int): The sample rate of the audio.
+    band (tuple): The low and high cutoff frequencies in Hz.
+    order (int): The order of the filter.
+    zi (array): The filter state left by the previous chunk, when filtering a stream chunk by chunk.
+    zero_phase (bool): Whether to filter forwards and backwards to remove the filter delay.
+
+    Returns:
+    array: The filtered audio data, and the filter state for the next chunk if `zi` was given.
+    """
+    data = np.asarray(data)
+    dtype = filter_dtype(data)
+    metrics.count('samples_filtered_total', len(data))
+
+    # Copy the cached coefficients in the working precision, sosfilt needs a writable array
+    sos = np.array(butter_bandpass(sr, band, order), dtype=dtype)
+
+    with metrics.stage('filter', samples=len(data)):
+        if zero_phase:
+            # Filter forwards and backwards, this needs the whole signal at once
+            return sosfiltfilt(sos, data.astype(dtype, copy=False))
+
+        if zi is None:
+            return sosfilt(sos, data.astype(dtype, copy=False))
+
+        # Filter the chunk and return the state for the next one
+        return sosfilt(sos, data.astype(dtype, copy=False), zi=zi.astype(dtype, copy=False))
+
+
+def filter_chunks(chunks, sr, band, order=filter_order):
+    """
+    This function applies the Butterworth bandpass filter to a stream of chunks,
+    carrying the filter state from one chunk to the next.
+
+    Parameters:
+    chunks (iterable): The chunks of audio data.
+    sr (int): The sample rate of the audio.
+    band (tuple): The low and high cutoff frequencies in Hz.
+    order (int): The order of the filter.
+
+    Yields:
+    array: The filtered chunks, identical to filtering their concatenation at once.
+    """
+    zi = None
+    for chunk in chunks:
+        chunk = np.asarray(chunk)
+
+        # Start from a zero state in the precision of the first chunk
+        if zi is None:
+            zi = initial_state(sr, band, order, filter_dtype(chunk))
+
+        filtered_chunk, zi = butter_bandpass_filter(chunk, sr, band, order, zi=zi)
+        yield filtered_chunk
+
+
+# -----------------Samples----------------- #
+
+def to_int16(data, overwrite=False):
+    """
+    This function converts samples to int16 for a WAV file or the sound card.
+    Samples are rounded to the nearest integer and those out of range saturate, instead of wrapping around as a plain cast does.
+
+    Parameters:
+    data (array): The samples.
+    overwrite (bool): Whether float samples can be rounded and clipped in place, saving a copy of the signal.
+
+    Returns:
+    array: The int16 samples.
+    """
+    data = np.asarray(data)
+    if data.dtype == np.int16:
+        return data
+
+    if not np.issubdtype(data.dtype, np.floating):
+        # Integers only need to saturate
+        return np.clip(data, int16_min, int16_max).astype(np.int16)
+
+    # Round and clip in a single buffer, the caller's one if it can be overwritten
+    out = data if overwrite and data.flags.writeable else np.empty_like(data)
+    np.rint(data, out=out)
+    np.clip(out, int16_min, int16_max, out=out)
+    return out.astype(np.int16)
@@ -0,0 +1,242 @@
+import struct
+import binascii
+from itertools import repeat
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import reedsolo
+import metrics
+
+# ---------------Parameters--------------- #
+
+block_size = 200
+parallel_blocks = 64
+
+# Bytes received with a lower confidence are erased, Reed-Solomon corrects twice as many erasures as errors
+erasure_threshold = 0.3
+
+# Sequence number (2 bytes) and payload length (1 byte) before the payload, CRC (2 bytes) after it
+header_format = '>HB'
+header_size = struct.calcsize(header_format)
+crc_size = 2
+
+# The 16-bit sequence number numbers this many blocks, about 13 MB of payload
+max_blocks = 1 << 16
+
+
+# -----------------Codec----------------- #
+
+@lru_cache(maxsize=None)
+def rs_codec(ecc_bytes):
+    """
+    This function returns a Reed-Solomon codec, created once per number of error correction bytes.
+
+    Parameters:
+    ecc_bytes (int): The number of error correction bytes of each block.
+
+    Returns:
+    RSCodec: The codec.
+    """
+    return reedsolo.RSCodec(ecc_bytes)
+
+
+def block_length(ecc_bytes, payload_length=block_size):
+    """
+    This function returns the length of an encoded block.
+
+    Parameters:
+    ecc_bytes (int): The number of error correction bytes of each block.
+    payload_length (int): The number of payload bytes in the block.
+
+    Returns:
+    int: The number of bytes of the block once encoded.
+    """
+    return header_size + payload_length + crc_size + ecc_bytes
+
+
+# -----------------Encode----------------- #
+
+def encode_block(sequence, payload, ecc_bytes):
+    """
+    This function encodes one block: header, payload and CRC, protected by Reed-Solomon.
+
+    Parameters:
+    sequence (int): The sequence number of the block.
+    payload (bytes): The payload of the block, at most block_size bytes.
+    ecc_bytes (int): The number of error correction bytes.
+
+    Returns:
+    bytearray: The encoded block.
+    """
+    # Prefix the payload with the sequence number and its length
+    message = struct.pack(header_format, sequence, len(payload)) + payload
+
+    # Append a CRC of the header and payload
+    message += struct.pack('>H', binascii.crc_hqx(message, 0))
+
+    return rs_codec(ecc_bytes).encode(message)
+
+
+def encode_blocks(data, ecc_bytes):
+    """
+    This function splits data into blocks and encodes each of them.
+    Every block holds block_size bytes of payload, except the last one which is shortened.
+
+    Parameters:
+    data (bytes): The data.
+    ecc_bytes (int): The number of error correction bytes of each block.
+
+    Returns:
+    bytearray: The encoded blocks, one after the other.
+    """
+    if block_length(ecc_bytes) > 255:
+        raise ValueError(f"Blocks of {block_size} bytes do not fit in a codeword with {ecc_bytes} ECC bytes")
+
+    n_blocks = -(-len(data) // block_size)
+    if n_blocks > max_blocks:
+        raise ValueError(f"A payload of {len(data)} bytes needs {n_blocks} blocks, a frame holds at most {max_blocks} "
+                         f"({max_blocks * block_size} bytes)")
+
+    encoded = bytearray()
+    for sequence, start in enumerate(range(0, max(len(data), 1), block_size)):
+        encoded += encode_block(sequence, bytes(data[start:start + block_size]), ecc_bytes)
+    return encoded
+
+
+# -----------------Decode----------------- #
+
+def check_block(message):
+    """
+    This function checks the CRC of a block corrected by Reed-Solomon and reads its header.
+
+    Parameters:
+    message (bytes): The corrected block, without its ECC bytes.
+
+    Returns:
+    tuple: The sequence number and the payload of the block, or None if the block is not valid.
+    """
+    # Check the CRC, it catches the rare blocks Reed-Solomon corrects to a wrong codeword
+    body, crc = message[:-crc_size], message[-crc_size:]
+    if len(body) < header_size or struct.unpack('>H', crc)[0] != binascii.crc_hqx(body, 0):
+        return None
+
+    sequence, length = struct.unpack(header_format, body[:header_size])
+    payload = bytes(body[header_size:])
+    if length != len(payload):
+        return None
+
+    return sequence, payload
+
+
+def decode_block(block, ecc_bytes, erase_pos=None):
+    """
+    This function decodes one block and checks its CRC.
+    Some of the unreliable bytes are often right, and erasing too many of them leaves no room for the errors,
+    so when the block fails the least reliable half of the erasures is tried, and so on down to errors only.
+
+    Parameters:
+    block (bytes): The encoded block.
+    ecc_bytes (int): The number of error correction bytes.
+    erase_pos (list): The positions of the bytes of the block known to be unreliable, the least reliable first.
+
+    Returns:
+    tuple: The sequence number, the payload and the number of bytes corrected or erased, or None if the block could not be recovered.
+    """
+    erase_pos = list(erase_pos or [])
+    while True:
+        try:
+            message, _, errata = rs_codec(ecc_bytes).decode(bytearray(block), erase_pos=sorted(erase_pos) or None)
+            result = check_block(message)
+        except reedsolo.ReedSolomonError:
+            result = None
+
+        if result is not None:
+            return result + (len(errata),)
+        if not erase_pos:
+            return None
+        erase_pos = erase_pos[:len(erase_pos) // 2]
+
+
+def erasures(confidence, ecc_bytes):
+    """
+    This function picks the bytes of a block to erase.
+
+    Parameters:
+    confidence (array): The confidence of every byte of the block.
+    ecc_bytes (int): The number of error correction bytes, no more bytes than this can be erased.
+
+    Returns:
+    list: The positions of the bytes to erase, the least reliable first.
+    """
+    unreliable = np.flatnonzero(confidence < erasure_threshold)
+    unreliable = unreliable[np.argsort(confidence[unreliable], kind='stable')]
+    return unreliable[:ecc_bytes].tolist()
+
+
+def split_blocks(data, ecc_bytes):
+    """
+    This function splits encoded data into its blocks.
+
+    Parameters:
+    data (bytes): The encoded blocks, one after the other.
+    ecc_bytes (int): The number of error correction bytes of each block.
+
+    Returns:
+    list: The encoded blocks. Trailing bytes too short to be a block are dropped.
+    """
+    length = block_length(ecc_bytes)
+    blocks = [data[start:start + length] for start in range(0, len(data), length)]
+
+    # The last block is shortened, but always holds at least its header, CRC and ECC
+    if blocks and len(blocks[-1]) < block_length(ecc_bytes, 0):
+        blocks.pop()
+    return blocks
+
+
+def decode_blocks(data, ecc_bytes, workers=None, confidence=None):
+    """
+    This function decodes every block independently and puts their payloads back in order.
+    Large transfers are decoded across a process pool.
+
+    Parameters:
+    data (bytes): The encoded blocks, one after the other.
+    ecc_bytes (int): The number of error correction bytes of each block.
+    workers (int): The number of processes for large transfers, 1 decodes in this process.
+    confidence (array): The confidence of every byte, the unreliable bytes are erased.
+
+    Returns:
+    tuple: The data, and the sequence numbers of the blocks that could not be recovered and need to be sent again.
+    """
+    blocks = split_blocks(bytes(data), ecc_bytes)
+
+    # Find the bytes to erase in every block
+    if confidence is None:
+        erase_positions = [None] * len(blocks)
+    else:
+        length = block_length(ecc_bytes)
+        confidence = np.asarray(confidence)
+        erase_positions = [erasures(confidence[index * length:index * length + len(block)], ecc_bytes)
+                           for index, block in enumerate(blocks)]
+
+    # Only start processes when there are enough blocks to pay for them
+    if len(blocks) >= parallel_blocks and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(decode_block, blocks, repeat(ecc_bytes), erase_positions, chunksize=16))
+    else:
+        results = [decode_block(block, ecc_bytes, erase_pos) for block, erase_pos in zip(blocks, erase_positions)]
+
+    # Put the payloads in order, the position of a block stands for its sequence number if it was lost
+    payloads = {}
+    corrections = 0
+    for result in results:
+        if result is not None:
+            payloads[result[0]] = result[1]
+            corrections += result[2]
+    missing = [sequence for sequence in range(len(blocks)) if sequence not in payloads]
+
+    metrics.count('rs_blocks_total', len(blocks))
+    metrics.count('rs_corrections_total', corrections)
+    metrics.count('rs_erasures_total', sum(len(erase_pos or ()) for erase_pos in erase_positions))
+    metrics.count('rs_failed_blocks_total', len(missing))
+
+    return b''.join(payloads[sequence] for sequence in sorted(payloads)), missing
@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import itertools
+import threading
+from contextlib import contextmanager
+
+# ---------------Parameters--------------- #
+
+# Metrics cost a few microseconds per stage, they are collected unless turned off here
+enabled = True
+
+# Every stage and frame is also appended as a JSON line to this file if set, here or with the ACOUSTIC_METRICS_LOG environment variable
+log_file = os.environ.get('ACOUSTIC_METRICS_LOG') or None
+
+# Messages meant for a person are printed only when an interface or a script turns this on, never when used as a library
+verbose = False
+
+# Prefix of the exported metric names
+prefix = 'acoustic'
+
+# Upper bounds of the buckets of every histogram, the last bucket holds everything above
+buckets = {
+    'stage_seconds': (0.0001, 0.001, 0.01, 0.1, 1.0, 10.0, 100.0),
+    'sync_confidence': (0.6, 0.7, 0.8, 0.9, 0.95, 0.99),
+    'snr_db': (0.0, 5.0, 10.0, 15.0, 20.0, 25.0, 30.0, 40.0, 60.0),
+}
+
+counters = {}
+histograms = {}
+owner = os.getpid()
+lock = threading.Lock()
+
+
+# -----------------Record----------------- #
+
+def claim():
+    """
+    This function empties the metrics inherited from the parent by a forked worker process, so they are not counted twice.
+    It must be called with the lock held.
+
+    Returns:
+    None
+    """
+    global owner
+    if owner != os.getpid():
+        counters.clear()
+        histograms.clear()
+        owner = os.getpid()
+
+
+def count(name, value=1, **labels):
+    """
+    This function adds to a counter.
+
+    Parameters:
+    name (str): The name of the counter, ending with _total.
+    value (float): The amount to add.
+    **labels: The labels of the counter.
+
+    Returns:
+    None
+    """
+    if not enabled:
+        return
+
+    key = (name, tuple(sorted(labels.items())))
+    with lock:
+        claim()
+        counters[key] = counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """
+    This function records a value in a histogram.
+
+    Parameters:
+    name (str): The name of the histogram, a key of buckets.
+    value (float): The value.
+    **labels: The labels of the histogram.
+
+    Returns:
+    None
+    """
+    if not enabled:
+        return
+
+    bounds = buckets[name]
+    key = (name, tuple(sorted(labels.items())))
+    with lock:
+        claim()
+        histogram = histograms.setdefault(key, [[0] * (len(bounds) + 1), 0.0, 0])
+
+        # Count the value in the first bucket it fits in, both exports make the buckets cumulative
+        index = next((index for index, bound in enumerate(bounds) if value <= bound), len(bounds))
+        histogram[0][index] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def event(name, **fields):
+    """
+    This function appends an event to the JSON log, if there is one.
+
+    Parameters:
+    name (str): The name of the event.
+    **fields: The fields of the event.
+
+    Returns:
+    None
+    """
+    if log_file is None:
+        return
+
+    line = json.dumps({'timestamp': time.time(), 'pid': os.getpid(), 'event': name, **fields}, default=str)
+    with lock:
+        with open(log_file, 'a') as file:
+            file.write(line + '\n')
+
+
+@contextmanager
+def stage(name, **fields):
+    """
+    This function times a stage of the sender or the receiver.
+
+    Parameters:
+    name (str): The name of the stage.
+    **fields: Counts to log with the stage, more can be added to the yielded dict.
+
+    Yields:
+    dict: The fields logged with the stage.
+    """
+    if not enabled:
+        yield fields
+        return
+
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        seconds = time.perf_counter() - start
+        observe('stage_seconds', seconds, stage=name)
+        event('stage', stage=name, seconds=seconds, **fields)
+
+
+def say(message):
+    """
+    This function prints a message for a person, unless the modules are used as a library.
+
+    Parameters:
+    message (str): The message.
+
+    Returns:
+    None
+    """
+    if verbose:
+        print(message)
+
+
+# -----------------Processes----------------- #
+
+def collect():
+    """
+    This function takes the metrics recorded so far out of this process, to send them to the parent process.
+
+    Returns:
+    tuple: The counters and the histograms, to be passed to merge.
+    """
+    with lock:
+        claim()
+        collected = (dict(counters), {key: [list(histogram[0]), histogram[1], histogram[2]]
+                                      for key, histogram in histograms.items()})
+        counters.clear()
+        histograms.clear()
+    return collected
+
+
+def merge(collected):
+    """
+    This function adds the metrics collected in another process to the metrics of this one.
+
+    Parameters:
+    collected (tuple): The counters and the histograms returned by collect.
+
+    Returns:
+    None
+    """
+    collected_counters, collected_histograms = collected
+    with lock:
+        claim()
+        for key, value in collected_counters.items():
+            counters[key] = counters.get(key, 0) + value
+        for key, (bucket_counts, total, samples) in collected_histograms.items():
+            histogram = histograms.setdefault(key, [[0] * len(bucket_counts), 0.0, 0])
+            histogram[0] = [a + b for a, b in zip(histogram[0], bucket_counts)]
+            histogram[1] += total
+            histogram[2] += samples
+
+
+def measured(function, *args):
+    """
+    This function runs a function in a worker process and returns its result with the metrics it recorded.
+
+    Parameters:
+    function (callable): The function.
+    *args: The arguments of the function.
+
+    Returns:
+    tuple: The result of the function, and its metrics to be passed to merge.
+    """
+    result = function(*args)
+    return result, collect()
+
+
+def reset():
+    """
+    This function drops every metric recorded so far.
+
+    Returns:
+    None
+    """
+    with lock:
+        counters.clear()
+        histograms.clear()
+
+
+# -----------------Export----------------- #
+
+def series(name, labels, extra=()):
+    """
+    This function formats the name and labels of a series in the Prometheus text format.
+
+    Parameters:
+    name (str): The name of the metric, without the prefix.
+    labels (tuple): The sorted (label, value) pairs.
+    extra (tuple): More (label, value) pairs, added last.
+
+    Returns:
+    str: The series.
+    """
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return f"{prefix}_{name}"
+
+    rendered = ','.join(f'{label}="{value}"' for label, value in pairs)
+    return f"{prefix}_{name}{{{rendered}}}"
+
+
+def number(value):
+    """
+    This function formats a value in the Prometheus text format, keeping every digit of large counts.
+
+    Parameters:
+    value (float): The value.
+
+    Returns:
+    str: The value.
+    """
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def snapshot():
+    """
+    This function returns the metrics recorded so far, for a JSON log or an API.
+
+    Returns:
+    dict: The value of every counter, and the buckets, sum and count of every histogram, keyed by series.
+    Like in the Prometheus export, every bucket counts the values up to its bound.
+    """
+    with lock:
+        claim()
+        return {
+            'counters': {series(name, labels): value for (name, labels), value in sorted(counters.items())},
+            'histograms': {series(name, labels): {'buckets': dict(zip([str(bound) for bound in buckets[name]] + ['+Inf'],
+                                                                      itertools.accumulate(histogram[0]))),
+                                                  'sum': histogram[1], 'count': histogram[2]}
+                           for (name, labels), histogram in sorted(histograms.items())},
+        }
+
+
+def prometheus():
+    """
+    This function exports the metrics recorded so far in the Prometheus text format.
+
+    Returns:
+    str: The metrics, one series per line.
+    """
+    lines = []
+    with lock:
+        claim()
+        typed = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                typed.add(name)
+            lines.append(f"{series(name, labels)} {number(value)}")
+
+        for (name, labels), (bucket_counts, total, samples) in sorted(histograms.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {prefix}_{name} histogram")
+                typed.add(name)
+
+            # Prometheus buckets count every value up to their bound
+            cumulative = 0
+            for bound, bucket_count in zip([f"{bound:g}" for bound in buckets[name]] + ['+Inf'], bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{series(name + '_bucket', labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{series(name + '_sum', labels)} {number(total)}")
+            lines.append(f"{series(name + '_count', labels)} {samples}")
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,56 @@
+import numpy as np
+
+# ---------------Parameters--------------- #
+
+band_low = 17000
+band_high = 20000
+
+
+# -----------------Carriers----------------- #
+
+def carrier_frequencies(carriers, sr, duration):
+    """
+    This function spreads the tones of parallel carriers evenly over the band.
+    Every tone sits exactly on a frequency bin of one symbol, so the carriers are
+    orthogonal and a single FFT of a symbol measures all of them.
+
+    Parameters:
+    carriers (int): The number of carriers.
+    sr (int): The sample rate of the audio.
+    duration (float): The duration of one symbol.
+
+    Returns:
+    array: A (2, carriers) array with the low frequency of each carrier in row 0 and its high frequency in row 1.
+    """
+    # Calculate the spacing of the frequency bins of one symbol
+    bin_width = sr / int(sr * duration)
+
+    # Find the first and last bins inside the band
+    first_bin = int(np.ceil(band_low / bin_width))
+    last_bin = int(np.floor(band_high / bin_width))
+
+    # Check that every tone gets its own bin
+    if carriers < 1 or 2 * carriers > last_bin - first_bin + 1:
+        raise ValueError(f"{carriers} carriers do not fit between {band_low} Hz and {band_high} Hz")
+
+    # Place the low frequencies in the lower half of the band and the high frequencies in the upper half
+    spacing = (last_bin - first_bin) // (2 * carriers - 1)
+    bins = first_bin + spacing * np.arange(2 * carriers)
+
+    return bins.reshape(2, carriers) * bin_width
+
+
+def max_carriers(sr, duration):
+    """
+    This function returns the highest number of carriers that fit in the band.
+
+    Parameters:
+    sr (int): The sample rate of the audio.
+    duration (float): The duration of one symbol.
+
+    Returns:
+    int: The number of carriers.
+    """
+    bin_width = sr / int(sr * duration)
+    n_bins = int(np.floor(band_high / bin_width)) - int(np.ceil(band_low / bin_width)) + 1
+    return n_bins // 2
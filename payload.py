@@ -0,0 +1,132 @@
+import zlib
+
+# ---------------Parameters--------------- #
+
+# Compression of the payloads: 'none', 'zlib', 'dictionary', or 'auto' for the smallest of the three
+compression = 'auto'
+
+# Payloads are refused when they decompress to more than this, so a corrupted or crafted payload cannot exhaust memory
+max_payload_bytes = 16 * 1024 * 1024
+
+# Flags of the header byte sent before every payload
+text_flag = 0x80
+methods = {'none': 0x00, 'zlib': 0x01, 'dictionary': 0x02}
+method_mask = 0x0F
+
+# Deflate finds the strings of short messages in this preset dictionary instead of sending them,
+# the most frequent ones are at the end where they are the cheapest to refer to. Changing it breaks the frames already sent.
+preset_dictionary = (
+    b"https://www. .com .org @gmail.com "
+    b"please thank you thanks sorry today tomorrow tonight morning evening "
+    b"meeting message password address number phone email call back later "
+    b"where when what who how why which would could should "
+    b"there their they them then than this that these those "
+    b"have has had was were been will can not but from with your you "
+    b"for are and the of to in is it on at be as by or an a I "
+    b"Hello hello Hi hi OK ok yes no "
+)
+
+# Size of the header sent before every payload
+header_size = 1
+
+
+# -----------------Payload----------------- #
+
+def compress(data, method):
+    """
+    This function compresses data with raw deflate, without the zlib header and checksum that Reed-Solomon makes useless.
+
+    Parameters:
+    data (bytes): The data.
+    method (str): 'zlib', or 'dictionary' to use the preset dictionary.
+
+    Returns:
+    bytes: The compressed data.
+    """
+    if method == 'dictionary':
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=preset_dictionary)
+    else:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(data, method):
+    """
+    This function decompresses data compressed by compress.
+
+    Parameters:
+    data (bytes): The compressed data.
+    method (str): 'zlib' or 'dictionary'.
+
+    Returns:
+    bytes: The data.
+    """
+    if method == 'dictionary':
+        decompressor = zlib.decompressobj(-15, zdict=preset_dictionary)
+    else:
+        decompressor = zlib.decompressobj(-15)
+
+    try:
+        data = decompressor.decompress(data, max_payload_bytes)
+    except zlib.error as e:
+        raise ValueError(f"Invalid compressed payload: {e}")
+
+    if decompressor.unconsumed_tail:
+        raise ValueError(f"The payload decompresses to more than {max_payload_bytes} bytes")
+    if not decompressor.eof:
+        raise ValueError("Invalid compressed payload: the stream is truncated")
+    return data
+
+
+def pack(data, text=False, method=None):
+    """
+    This function prepares a payload to be sent, with the header byte telling the receiver how to read it back.
+
+    Parameters:
+    data (bytes): The payload.
+    text (bool): Whether the payload is UTF-8 text.
+    method (str): 'none', 'zlib', 'dictionary', or 'auto' for the smallest of the three, the compression parameter if None.
+
+    Returns:
+    bytes: The header byte followed by the payload, compressed or not.
+    """
+    if method is None:
+        method = compression
+    data = bytes(data)
+
+    if method == 'auto':
+        # Keep the smallest encoding, the data itself when compression does not pay
+        candidates = [('none', data)] + [(name, compress(data, name)) for name in ('zlib', 'dictionary')]
+        method, data = min(candidates, key=lambda candidate: len(candidate[1]))
+    elif method not in methods:
+        raise ValueError(f"Unknown compression {method}")
+    elif method != 'none':
+        data = compress(data, method)
+
+    header = methods[method] | (text_flag if text else 0)
+    return bytes([header]) + data
+
+
+def unpack(packed):
+    """
+    This function reads back a payload prepared by pack.
+
+    Parameters:
+    packed (bytes): The header byte followed by the payload.
+
+    Returns:
+    tuple: The payload, and whether it is UTF-8 text.
+    """
+    if len(packed) < header_size:
+        raise ValueError("Empty payload")
+
+    header, data = packed[0], bytes(packed[header_size:])
+    names = {value: name for name, value in methods.items()}
+    if header & method_mask not in names or header & ~(text_flag | method_mask):
+        raise ValueError("Invalid payload header")
+
+    method = names[header & method_mask]
+    if method != 'none':
+        data = decompress(data, method)
+
+    return data, bool(header & text_flag)
@@ -0,0 +1,127 @@
+from multicarrier import band_low, band_high, max_carriers
+
+# ---------------Parameters--------------- #
+
+# Version of the settings below and of the profile table. The sender and the receiver read them from here so they always
+# agree, any change that alters the signal of a frame must bump it, so cached signals and stored reports are told apart
+version = 1
+
+sample_rate = 44100
+low_frequency = 18000
+high_frequency = 19000
+bit_duration = 0.007
+amplitude_scaling_factor = 15.0
+filter_band = (band_low - 500, band_high + 500)
+flag_duration = 6 * 0.0014
+silence_duration = 0.1
+ecc_bytes = 20
+
+# The header holds the profile in its 4 high bits and the number of carriers in its 4 low bits
+header_bits = 8
+max_profile = 15
+
+# Profile 0 is not in the table, it stands for the bit_duration and ecc_bytes above.
+# The others trade robustness for speed, from the slowest to the fastest. min_snr_db is the SNR measured by
+# the receiver on the flags (receiver.estimate_snr) above which every frame of 100 bytes decodes in `python channel.py`.
+profile_table = {
+    1: {'name': 'robust', 'bit_duration': 0.010, 'ecc_bytes': 40, 'carriers': 1, 'min_snr_db': 0.0},
+    2: {'name': 'standard', 'bit_duration': 0.007, 'ecc_bytes': 20, 'carriers': 1, 'min_snr_db': 15.0},
+    3: {'name': 'fast', 'bit_duration': 0.007, 'ecc_bytes': 16, 'carriers': 4, 'min_snr_db': 17.0},
+    4: {'name': 'faster', 'bit_duration': 0.005, 'ecc_bytes': 16, 'carriers': 6, 'min_snr_db': 20.0},
+    5: {'name': 'fastest', 'bit_duration': 0.004, 'ecc_bytes': 12, 'carriers': 6, 'min_snr_db': 23.0},
+}
+
+# Extra SNR required on top of min_snr_db when picking a profile, for conditions that change between the measure and the send
+snr_margin = 3.0
+
+
+# -----------------Profiles----------------- #
+
+def profile_settings(profile, carriers=1, sr=None):
+    """
+    This function returns the symbol duration, ECC bytes and number of carriers a frame is sent with.
+
+    Parameters:
+    profile (int): The profile, 0 for the bit_duration and ecc_bytes parameters.
+    carriers (int): The number of carriers used by profile 0.
+    sr (int): The sample rate of the audio, the sample_rate parameter if None.
+
+    Returns:
+    tuple: The duration of one symbol, the number of error correction bytes and the number of carriers.
+    """
+    if sr is None:
+        sr = sample_rate
+
+    if profile == 0:
+        return bit_duration, ecc_bytes, carriers
+
+    if profile not in profile_table:
+        raise ValueError(f"Unknown profile {profile}")
+
+    settings = profile_table[profile]
+    return settings['bit_duration'], settings['ecc_bytes'], min(settings['carriers'], max_carriers(sr, settings['bit_duration']))
+
+
+def describe(profile, carriers=1, sr=None):
+    """
+    This function gathers every setting a frame is sent with, for the signal cache and the reports of the receiver.
+
+    Parameters:
+    profile (int): The profile, 0 for the bit_duration and ecc_bytes parameters.
+    carriers (int): The number of carriers used by profile 0.
+    sr (int): The sample rate of the audio, the sample_rate parameter if None.
+
+    Returns:
+    dict: The settings of the frame, with the version they belong to.
+    """
+    duration, ecc, carriers = profile_settings(profile, carriers, sr)
+    return {
+        'version': version,
+        'profile': profile,
+        'name': profile_table[profile]['name'] if profile in profile_table else 'custom',
+        'sample_rate': sr or sample_rate,
+        'low_frequency': low_frequency,
+        'high_frequency': high_frequency,
+        'bit_duration': duration,
+        'ecc_bytes': ecc,
+        'carriers': carriers,
+        'amplitude_scaling_factor': amplitude_scaling_factor,
+        'filter_band': filter_band,
+        'flag_duration': flag_duration,
+        'silence_duration': silence_duration,
+    }
+
+
+def payload_rate(profile, sr=None):
+    """
+    This function returns the raw payload rate of a profile, before Reed-Solomon and framing overheads.
+
+    Parameters:
+    profile (int): The profile.
+    sr (int): The sample rate of the audio.
+
+    Returns:
+    float: The rate in bits per second.
+    """
+    duration, ecc, carriers = profile_settings(profile, sr=sr)
+
+    # Every bit takes two Manchester symbols on one carrier
+    return carriers / (2 * duration)
+
+
+def select_profile(snr_db, margin=snr_margin):
+    """
+    This function picks the fastest profile that decodes reliably at a measured SNR.
+
+    Parameters:
+    snr_db (float): The SNR measured by the receiver, the lowest of its bands.
+    margin (float): The extra SNR required on top of the minimum of a profile.
+
+    Returns:
+    int: The profile, the most robust one when none is expected to decode reliably.
+    """
+    suitable = [profile for profile, settings in profile_table.items() if snr_db - margin >= settings['min_snr_db']]
+    if not suitable:
+        return min(profile_table, key=payload_rate)
+
+    return max(suitable, key=payload_rate)
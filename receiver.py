@@ -1,420 +1,1309 @@
 import numpy as np
-from scipy.io.wavfile import write
-from scipy.signal import find_peaks
-from scipy.fft import fft
-from tqdm import tqdm
-import matplotlib.pyplot as plt
+from scipy.fft import rfft
 from scipy.io.wavfile import read
 from scipy import signal
-import gradio as gr
-import reedsolo
-import wavio
-from scipy.signal import butter, lfilter
+from functools import lru_cache
+from itertools import repeat
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import filters
+from filters import butter_bandpass_filter, filter_chunks
+from multicarrier import carrier_frequencies
+import diagnostics
+from framing import decode_blocks, rs_codec
+import profiles
+from profiles import profile_table, profile_settings, select_profile
+import payload
+import metrics
 
 # ---------------Parameters--------------- #
 
-input_file = 'input_text.wav'
-output_file = 'output_filtered_receiver.wav'
+recorded_file = 'recorded.wav'
 
-low_frequency = 18000
-high_frequency = 19000
-bit_duration = 0.007
-sample_rate = 44100
-amplitude_scaling_factor = 10.0
+flag_threshold = 0.6
+silence_level = 1e-5
 
+# Flags are searched this many windows at a time, so a flag near the start of a long capture is found without correlating all of it
+sync_block_size = 1 << 18
 
-# -----------------Filter----------------- #
+# The noise is measured on up to noise_duration seconds before the start flag, SNR estimates are clipped to max_snr_db
+noise_duration = 0.08
+max_snr_db = 60.0
 
-def butter_bandpass(sr, order=5):
+# Long recordings are read memory-mapped and scanned scan_block_duration seconds at a time
+scan_block_duration = 10.0
+
+# Frames waiting to be decoded by the workers, the scan waits for the oldest one beyond this
+max_pending_frames = 16
+
+# Processes decoding the Reed-Solomon blocks of one frame. Frames are already decoded in parallel by decode_all, scan and
+# the pools of the async API and the service, a pool per frame inside their workers would oversubscribe the cores
+rs_workers = 1
+
+# A frame whose end flag has not come this many seconds after its start flag is abandoned when listening to the microphone,
+# so a missed end flag does not hold on to the audio forever. Files and pipes are read to their end instead
+listen_max_frame_duration = 300.0
+
+# Symbol timing recovery, the loop corrects the timing once every timing_block symbols
+timing_recovery = True
+timing_block = 64
+early_late_offset = 0.25
+timing_gain = 0.5
+drift_gain = 0.05
+
+
+# -----------------Record----------------- #
+
+def record(audio):
     """
-    This function designs a Butterworth bandpass filter.
+    This function records audio and writes it to a .wav file.
 
     Parameters:
+    audio (tuple): A tuple containing the sample rate and the audio data.
+
+    Returns:
+    str: A success message if the audio is recorded correctly, otherwise an error message.
+    """
+    try:
+        # Check if the audio tuple contains exactly two elements
+        if len(audio) != 2:
+            return f"Error: Expected a tuple with 2 elements, but got {len(audio)}"
+
+        # Unpack the sample rate and data from the audio tuple
+        sr, data = audio
+
+        # Import wavio here, only recording from the interface needs it
+        import wavio
+
+        # Write the audio data to a .wav file
+        with metrics.stage('wav_write', samples=len(data)):
+            wavio.write(recorded_file, data, sr)
+
+        # Return a success message
+        return f"Audio receive correctly"
+    except Exception as e:
+        # If an error occurs, return an error message
+        return f"Error: {str(e)}"
+
+
+# -----------------Frame----------------- #
+
+def estimate_snr(data, start_sample, sr):
+    """
+    This function estimates the Signal-to-Noise Ratio (SNR) of the low and high frequency bands of a frame.
+    The noise is measured in the silence before the start flag and the signal on the flag bits sent on each tone.
+
+    Parameters:
+    data (array): The filtered audio data.
+    start_sample (int): The index of the first sample after the start flag.
     sr (int): The sample rate of the audio.
-    order (int): The order of the filter.
 
     Returns:
-    tuple: The filter coefficients `b` and `a`.
+    array: The SNR in dB of the low and high frequency bands.
     """
-    # Calculate the Nyquist frequency
-    nyquist = 0.5 * sr
+    bit_length = int(sr * profiles.flag_duration)
+    flag_start = start_sample - 6 * bit_length
+    references = tone_references(sr, bit_length, data.dtype)
 
-    # Normalize the cutoff frequencies with a 500 Hz offset
-    low = (low_frequency - 500) / nyquist
-    high = (high_frequency + 500) / nyquist
+    # Measure the noise on whole flag bit windows before the flag, leaving one out for the ringing of the filter
+    noise_end = flag_start - bit_length
+    n_windows = min(int(sr * noise_duration) // bit_length, noise_end // bit_length)
+    if n_windows < 1:
+        raise ValueError("No silence before the start flag to measure the noise on")
+    noise = data[noise_end - n_windows * bit_length:noise_end].reshape(n_windows, bit_length)
+    noise_energy = np.mean(np.abs(noise @ references) ** 2, axis=0)
 
-    # Design the Butterworth bandpass filter
-    coef = butter(order, [low, high], btype='band')
+    # Measure the tones during the start flag "100001", the low tone is sent on bits 1 to 4 and the high tone on bits 0 and 5
+    flag = np.abs(data[flag_start:start_sample].reshape(6, bit_length) @ references) ** 2
+    flag_energy = np.array([flag[1:5, 0].mean(), flag[[0, 5], 1].mean()])
 
-    # Extract the filter coefficients
-    b = coef[0]
-    a = coef[1]
+    # Remove the noise from the tone energy and compare the two, a silent band gives an infinite ratio that is clipped
+    tiny = np.finfo(flag_energy.dtype).tiny
+    with np.errstate(over='ignore'):
+        snr = 10 * np.log10(np.maximum(flag_energy - noise_energy, tiny) / np.maximum(noise_energy, tiny))
 
-    return b, a
+    return np.clip(snr, -max_snr_db, max_snr_db)
 
 
-def butter_bandpass_filter(data, sr, order=5):
+@lru_cache(maxsize=None)
+def flag_reference(bit_value, sr):
     """
-    This function applies the Butterworth bandpass filter to a given data.
+    This function generates the filtered start or end flag used to detect frames in a stream.
 
     Parameters:
-    data (array): The audio data to be filtered.
+    bit_value (int): The bit value (0 for the start flag, 1 for the end flag).
     sr (int): The sample rate of the audio.
-    order (int): The order of the filter.
 
     Returns:
-    array: The filtered audio data.
+    array: The flag signal as it looks after the bandpass filter.
     """
-    # Get the filter coefficients
-    b, a = butter_bandpass(sr, order=order)
+    # Generate the time values for one flag bit
+    t = np.arange(int(sr * profiles.flag_duration)) / sr
 
-    # Apply the filter to the data
-    y = lfilter(b, a, data)
+    # Generate the same square waves as the sender
+    low = np.sign(np.sin(2 * np.pi * profiles.low_frequency * t))
+    high = np.sign(np.sin(2 * np.pi * profiles.high_frequency * t))
+    binary_flag = "100001" if bit_value == 0 else "011110"
+    flag = np.concatenate([low if bit == '0' else high for bit in binary_flag])
 
-    return y
+    # Pass the flag through the same filter as the received audio
+    reference = butter_bandpass_filter(flag, sr, profiles.filter_band)
+    reference.setflags(write=False)
+    return reference
 
 
-def filtered():
+def flag_scores(data, reference):
     """
-    This function reads an audio file, applies the bandpass filter to the audio data,
-    and then writes the filtered data to an output file.
+    This function computes the normalised cross-correlation between audio data and a flag at every position.
+
+    Parameters:
+    data (array): The filtered audio data.
+    reference (array): The filtered flag signal.
 
     Returns:
-    str: A success message if the audio is filtered correctly, otherwise an error message.
+    array: The correlation, between -1 and 1, of the flag with the window starting at each sample.
     """
-    # Define the input and output file paths
-    input_file = 'recorded.wav'
-    output_file = 'output_filtered_receiver.wav'
+    length = len(reference)
 
-    # Read the audio data from the input file
-    sr, data = read(input_file)
+    with metrics.stage('sync', samples=len(data)):
+        # Correlate the data with the flag using an overlap-add convolution, in the precision the data was filtered in.
+        # The flag is much shorter than the data, so short FFTs cost less than one FFT of the whole data
+        dtype = filters.filter_dtype(data)
+        correlation = signal.oaconvolve(data.astype(dtype, copy=False), reference[::-1].astype(dtype, copy=False), mode='valid')
 
-    # Apply the bandpass filter to the audio data
-    filtered_data = butter_bandpass_filter(data, sr)
+        # Normalise by the energy of the flag and of every window of the data,
+        # windows quieter than the silence level are not normalised up, so filter ringing is not mistaken for a flag.
+        # The running sum stays in float64, the difference of two large float32 sums would lose the quiet windows
+        energy = np.concatenate(([0.0], np.cumsum(np.square(data, dtype=np.float64))))
+        window_energy = np.maximum(energy[length:] - energy[:-length], length * silence_level ** 2)
 
-    # Write the filtered data to the output file
-    write(output_file, sr, np.int16(filtered_data))
+        correlation /= np.linalg.norm(reference) * np.sqrt(window_energy)
+        return correlation
 
-    return "Filtered Audio Generated"
 
+def find_flag(data, reference, search_from=0, threshold=flag_threshold, final=False):
+    """
+    This function finds the first occurrence of a flag using a normalised cross-correlation.
 
-# -----------------Record----------------- #
+    Parameters:
+    data (array): The filtered audio data.
+    reference (array): The filtered flag signal.
+    search_from (int): The index of the first sample where the flag may start.
+    threshold (float): The minimum correlation, between 0 and 1, for a flag to be detected.
+    final (bool): Whether the data is complete, otherwise a flag too close to the end waits for more data.
 
-def record(audio):
+    Returns:
+    tuple: The index where the flag starts (None if it is not found), its correlation and the index to resume the search from.
     """
-    This function records audio and writes it to a .wav file.
+    length = len(reference)
+    position = search_from
+    while True:
+        # Correlate the windows of the next block, and one flag length more to find the peak of a flag starting at its end
+        segment = data[position:position + sync_block_size + 2 * length - 1]
+        if len(segment) < length:
+            return None, 0.0, position
+
+        score = flag_scores(segment, reference)
+        at_end = position + len(segment) == len(data)
+
+        # Look for the first window above the threshold, in the next block if there is none
+        candidates = np.flatnonzero(score > threshold)
+        if len(candidates) == 0:
+            if at_end:
+                return None, 0.0, position + len(score)
+            position += len(score)
+            continue
+
+        # The peak can only be trusted once a whole flag length after the candidate is available
+        first = candidates[0]
+        if first + length > len(score):
+            if not at_end:
+                # Correlate again from the candidate, the data after it is there
+                position += first
+                continue
+            if not final:
+                return None, 0.0, position + first
+
+        peak = first + np.argmax(score[first:first + length])
+        return position + peak, float(score[peak]), position + peak + length
+
+
+def frame_analyse(y, sr):
+    """
+    This function analyses audio data and returns the position of the frame between the start and end flags.
+    The flags are found by matched filtering, with a cross-correlation against their known signals.
 
     Parameters:
-    audio (tuple): A tuple containing the sample rate and the audio data.
+    y (array): The filtered audio data.
+    sr (int): The sample rate of the audio.
 
     Returns:
-    str: A success message if the audio is recorded correctly, otherwise an error message.
+    tuple: The index of the first sample after the start flag, the index of the first sample of the end flag,
+    and the confidence of the detection (the lowest correlation of the two flags).
     """
-    try:
-        # Check if the audio tuple contains exactly two elements
-        if len(audio) != 2:
-            return f"Error: Expected a tuple with 2 elements, but got {len(audio)}"
+    start_reference = flag_reference(0, sr)
+    end_reference = flag_reference(1, sr)
 
-        # Unpack the sample rate and data from the audio tuple
-        sr, data = audio
+    # Find the start flag
+    start_index, start_score, _ = find_flag(y, start_reference, final=True)
+    if start_index is None:
+        raise ValueError("No start flag found")
+    start_sample = start_index + len(start_reference)
 
-        # Write the audio data to a .wav file
-        wavio.write("recorded.wav", data, sr)
+    # Find the first end flag after it
+    end_sample, end_score, _ = find_flag(y, end_reference, start_sample, final=True)
+    if end_sample is None:
+        raise ValueError("No end flag found")
 
-        # Call the filtered function to apply the bandpass filter to the audio data
-        filtered()
+    # Plot the spectrogram in the background if the diagnostics are on
+    diagnostics.spectrogram(y, sr, start_sample, end_sample)
 
-        # Return a success message
-        return f"Audio receive correctly"
-    except Exception as e:
-        # If an error occurs, return an error message
-        return f"Error: {str(e)}"
+    confidence = min(start_score, end_score)
+    detected(confidence)
+    return start_sample, end_sample, confidence
 
 
-# -----------------Frame----------------- #
+def find_frames(y, sr):
+    """
+    This function finds every frame of a capture, pairing each start flag with the first end flag after it.
+
+    Parameters:
+    y (array): The filtered audio data.
+    sr (int): The sample rate of the audio.
+
+    Returns:
+    list: The index of the first sample after the start flag, the index of the first sample of the end flag
+    and the confidence of the detection of every frame, in order.
+    """
+    start_reference = flag_reference(0, sr)
+    end_reference = flag_reference(1, sr)
+    if len(y) < len(start_reference):
+        return []
+
+    # Correlate the whole capture with both flags once
+    start_scores = flag_scores(y, start_reference)
+    end_scores = flag_scores(y, end_reference)
+    start_candidates = np.flatnonzero(start_scores > flag_threshold)
+    end_candidates = np.flatnonzero(end_scores > flag_threshold)
+
+    frames = []
+    position = 0
+    while True:
+        # Find the next start flag, at the peak following its first window above the threshold
+        i = np.searchsorted(start_candidates, position)
+        if i == len(start_candidates):
+            break
+        first = start_candidates[i]
+        start_index = first + np.argmax(start_scores[first:first + len(start_reference)])
+        start_sample = start_index + len(start_reference)
+
+        # Find the first end flag after it
+        j = np.searchsorted(end_candidates, start_sample)
+        if j == len(end_candidates):
+            break
+        first = end_candidates[j]
+        end_sample = first + np.argmax(end_scores[first:first + len(end_reference)])
+
+        confidence = float(min(start_scores[start_index], end_scores[end_sample]))
+        detected(confidence)
+        frames.append((start_sample, end_sample, confidence))
+        position = end_sample + len(end_reference)
+
+    return frames
+
+
+def detected(confidence):
+    """
+    This function records the detection of a frame.
+
+    Parameters:
+    confidence (float): The confidence of the detection of its flags.
+
+    Returns:
+    None
+    """
+    metrics.count('frames_detected_total')
+    metrics.observe('sync_confidence', confidence)
+
+
+# -----------------Receiver----------------- #
+
+@lru_cache(maxsize=None)
+def tone_references(sr, length, dtype=np.float64):
+    """
+    This function generates the complex references used to measure the low and high frequency tones.
+
+    Parameters:
+    sr (int): The sample rate of the audio.
+    length (int): The number of samples in one symbol.
+    dtype (dtype): The type of the audio data, complex64 references are made for float32 data so the products are not upcast.
+
+    Returns:
+    array: A read-only (length, 2) array with the low frequency reference in column 0 and the high frequency one in column 1.
+    """
+    # Generate the time values for one symbol
+    t = np.arange(length) / sr
 
-def calculate_snr(data, start, end, target_frequency):
+    # One complex exponential per tone, so a product gives the DFT bin of each tone
+    references = np.exp(-2j * np.pi * np.outer(t, [profiles.low_frequency, profiles.high_frequency])).astype(np.result_type(dtype, np.complex64))
+
+    # The references are shared between calls, so protect them from modification
+    references.setflags(write=False)
+    return references
+
+
+def tone_energies(data, start_sample, n_symbols, sr, duration=None):
     """
-    This function calculates the Signal-to-Noise Ratio (SNR) for a given frequency within a segment of data.
+    This function measures the energy of the low and high frequency tones in consecutive symbols.
 
     Parameters:
     data (array): The audio data.
-    start (int): The start index of the segment.
-    end (int): The end index of the segment.
-    target_frequency (float): The frequency for which the SNR is to be calculated.
+    start_sample (int): The index of the first sample of the first symbol.
+    n_symbols (int): The number of symbols to measure.
+    sr (int): The sample rate of the audio.
+    duration (float): The duration of one symbol, bit_duration if None.
 
     Returns:
-    float: The calculated SNR.
+    array: A (n_symbols, 2) array with the low frequency energy in column 0 and the high frequency energy in column 1.
     """
-    try:
-        # Extract the segment from the data
-        segment = data[start:end]
+    if duration is None:
+        duration = profiles.bit_duration
 
-        # Perform a Fast Fourier Transform on the segment
-        spectrum = np.fft.fft(segment)
+    samples_per_symbol = int(sr * duration)
 
-        # Generate the frequencies corresponding to the FFT coefficients
-        frequencies = np.fft.fftfreq(len(spectrum), 1 / sample_rate)
+    # View the span as one row per symbol
+    windows = data[start_sample:start_sample + n_symbols * samples_per_symbol].reshape(n_symbols, samples_per_symbol)
 
-        # Find the index of the target frequency
-        target_index = np.abs(frequencies - target_frequency).argmin()
+    # Correlate every symbol with both tones in a single matrix product
+    return np.abs(windows @ tone_references(sr, samples_per_symbol, data.dtype)) ** 2
 
-        # Calculate the amplitude of the target frequency
-        amplitude = np.abs(spectrum[target_index])
 
-        # Define a noise segment
-        noise_segment = data[100:1000 + len(segment)]
+def demodulate(data, start_sample, end_sample, sr, duration=None):
+    """
+    This function converts the symbols between two samples to bits.
 
-        # Perform a Fast Fourier Transform on the noise segment
-        noise_spectrum = np.fft.fft(noise_segment)
+    Parameters:
+    data (array): The audio data.
+    start_sample (int): The index of the first sample of the first symbol.
+    end_sample (int): The index of the sample where the symbols stop.
+    sr (int): The sample rate of the audio.
+    duration (float): The duration of one symbol, bit_duration if None.
 
-        # Calculate the amplitude of the noise at the target frequency
-        noise_amplitude = np.abs(noise_spectrum[target_index])
+    Returns:
+    array: The bit values as uint8 (0 for the low frequency, 1 for the high frequency).
+    """
+    if duration is None:
+        duration = profiles.bit_duration
 
-        # Calculate the SNR
-        snr = 10 * np.log10(amplitude / noise_amplitude)
+    samples_per_symbol = int(sr * duration)
 
-        return snr
-    except Exception as e:
-        # If an error occurs, return an error message
-        return f"Error: {e}"
+    # Keep the span inside the audio data
+    start_sample = max(start_sample, 0)
+    end_sample = min(end_sample, len(data))
+
+    # Only complete symbols can be measured
+    n_symbols = max(-(-(end_sample - start_sample) // samples_per_symbol), 0)
+    n_symbols = min(n_symbols, (len(data) - start_sample) // samples_per_symbol)
+
+    # Pick the tone with the highest energy for every symbol
+    energies = tone_energies(data, start_sample, n_symbols, sr, duration)
+    return (energies[:, 1] > energies[:, 0]).astype(np.uint8)
+
+
+def window_energies(data, starts, sr, carriers, duration=None):
+    """
+    This function measures the energy of the low and high frequency tones in symbols starting at given samples.
+
+    Parameters:
+    data (array): The audio data.
+    starts (array): The index of the first sample of every symbol.
+    sr (int): The sample rate of the audio.
+    carriers (int): The number of carriers.
+    duration (float): The duration of one symbol, bit_duration if None.
+
+    Returns:
+    tuple: Two (len(starts), carriers) arrays with the energies of the low and high frequencies of every carrier.
+    """
+    if duration is None:
+        duration = profiles.bit_duration
+
+    samples_per_symbol = int(sr * duration)
+
+    # Gather one row per symbol, the symbols do not have to be evenly spaced
+    windows = data[starts[:, None] + np.arange(samples_per_symbol)]
+
+    if carriers > 1:
+        # Compute one FFT per symbol and read the bins of the carriers
+        spectrum = np.abs(rfft(windows, axis=1)) ** 2
+        bins = np.rint(carrier_frequencies(carriers, profiles.sample_rate, duration) * samples_per_symbol / sr).astype(int)
+        return spectrum[:, bins[0]], spectrum[:, bins[1]]
+
+    # Correlate every symbol with both tones in a single matrix product
+    energies = np.abs(windows @ tone_references(sr, samples_per_symbol, data.dtype)) ** 2
+    return energies[:, :1], energies[:, 1:]
+
+
+def track_symbols(data, start_sample, end_sample, sr, carriers, duration=None):
+    """
+    This function measures the tone energies of the symbols between two samples while following their timing,
+    so a sender and a receiver whose clocks differ stay aligned over long frames.
+    An early-late gate compares the energy of the detected tones in windows a bit before and after every symbol:
+    the late window loses more energy to the next symbol when the symbols are read too late, and the other way round.
+    Every timing_block symbols, the average of the comparison moves the position of the next symbol
+    and adjusts the length of a symbol, which tracks the drift between the clocks.
+
+    Parameters:
+    data (array): The audio data.
+    start_sample (int): The index of the first sample of the first symbol.
+    end_sample (int): The index of the sample where the symbols stop.
+    sr (int): The sample rate of the audio.
+    carriers (int): The number of carriers.
+    duration (float): The duration of one symbol, bit_duration if None.
+
+    Returns:
+    tuple: Two (n_symbols, carriers) arrays with the energies of the low and high frequencies of every carrier.
+    """
+    if duration is None:
+        duration = profiles.bit_duration
+
+    samples_per_symbol = int(sr * duration)
+    offset = int(early_late_offset * samples_per_symbol)
+    last_start = len(data) - samples_per_symbol
+
+    # Only complete symbols can be measured
+    end_sample = min(end_sample, len(data))
+
+    low = []
+    high = []
+    position = float(start_sample)
+    symbol_length = float(samples_per_symbol)
+
+    while True:
+        # Take the symbols of the block that start before the end, at least half of the last one must fit
+        count = min(timing_block, int(np.floor((end_sample - position) / symbol_length + 0.5)))
+        if count <= 0:
+            break
+
+        # Place the symbols of the block at their fractional positions, each read from the nearest sample
+        positions = position + symbol_length * np.arange(count)
+        starts = np.clip(np.rint(positions).astype(np.intp), 0, last_start)
+        if not timing_recovery:
+            block_low, block_high = window_energies(data, starts, sr, carriers, duration)
+            low.append(block_low)
+            high.append(block_high)
+            position = positions[-1] + symbol_length
+            continue
+
+        # Measure the symbols on time, early and late in a single call
+        shifted = np.clip(np.concatenate((starts, starts - offset, starts + offset)), 0, last_start)
+        block_low, block_high = window_energies(data, shifted, sr, carriers, duration)
+        low.append(block_low[:count])
+        high.append(block_high[:count])
+
+        # Compare the energy of the detected tones early and late
+        detected = block_high[:count] > block_low[:count]
+        early = np.where(detected, block_high[count:2 * count], block_low[count:2 * count]).sum()
+        late = np.where(detected, block_high[2 * count:], block_low[2 * count:]).sum()
+        error = (late - early) / max(early + late, np.finfo(float).tiny) * samples_per_symbol / 2
+
+        # Correct the length of a symbol slowly and the position of the next symbol quickly
+        symbol_length += drift_gain * error / count
+        position = positions[-1] + symbol_length + timing_gain * error
+
+    if not low:
+        return np.empty((0, carriers)), np.empty((0, carriers))
+    return np.concatenate(low), np.concatenate(high)
+
+
+def binary_to_payload(bits):
+    """
+    This function converts the bits of a payload back to the message that was sent.
+
+    Parameters:
+    bits (array): The bits, starting with the payload header.
+
+    Returns:
+    tuple: The message as bytes, decompressed, and whether it is UTF-8 text.
+    """
+    return payload.unpack(np.packbits(bits).tobytes())
 
 
-def frame_analyse(filename):
+def binary_to_text(bits):
     """
-    This function analyses an audio file and returns the start and end times of the signal of interest.
+    This function converts bits to text.
 
     Parameters:
-    filename (str): The path to the audio file.
+    bits (array): The bits.
 
     Returns:
-    tuple: The start and end times of the signal of interest.
+    str: The converted text.
     """
     try:
-        # Read the audio file
-        sr, y = read(filename)
-
-        # Define the start and end indices of the first and second parts of the audio data
-        first_part_start = 0
-        first_part_end = len(y) // 2
-        second_part_start = len(y) // 2
-        second_part_end = len(y)
-
-        # Define the segment length and overlap size for the spectrogram
-        segment_length = 256
-        overlap_size = 128
-
-        # Calculate the spectrogram of the audio data
-        f, t, sxx = signal.spectrogram(y, sr, nperseg=segment_length, noverlap=overlap_size)
-
-        # Plot the spectrogram
-        plt.figure()
-        plt.pcolormesh(t, f, sxx, shading="gouraud")
-        plt.xlabel("Time [s]")
-        plt.ylabel("Frequency [Hz]")
-        plt.title("Spectrogram of the signal")
-        plt.show()
-
-        # Define the target frequency
-        f0 = 18000
-
-        # Find the index of the target frequency
-        f_idx = np.argmin(np.abs(f - f0))
-
-        # Calculate the SNR thresholds for the start and end of the signal
-        thresholds_start = calculate_snr(y, first_part_start, first_part_end, low_frequency)
-        thresholds_end = calculate_snr(y, second_part_start, second_part_end, high_frequency)
-
-        # Find the start and end indices of the signal of interest
-        t_idx_start = np.argmax(sxx[f_idx] > thresholds_start)
-        t_idx_end = t_idx_start
-        while t_idx_end < len(t) and np.max(sxx[f_idx, t_idx_end:]) > thresholds_end:
-            t_idx_end += 1
-
-        # Convert the start and end indices to times
-        t_start = t[t_idx_start]
-        t_end = t[t_idx_end]
-
-        return t_start, t_end
+        # Read the payload back and decode it as UTF-8
+        data, text = binary_to_payload(bits)
+        return data.decode('utf-8')
     except Exception as e:
         # If an error occurs, return an error message
         return f"Error: {e}"
 
 
-# -----------------Receiver----------------- #
+def decode_rs(bits, ecc_bytes, confidence=None):
+    """
+    This function decodes bits encoded in blocks protected by Reed-Solomon encoding.
+
+    Parameters:
+    bits (array): The bits.
+    ecc_bytes (int): The number of error correction bytes of each block.
+    confidence (array): The confidence of every byte, the unreliable bytes are erased.
+
+    Returns:
+    array: The decoded bits.
+    """
+    # Pack the bits into bytes
+    byte_data = np.packbits(bits).tobytes()
+
+    # Decode every block independently
+    with metrics.stage('rs_decode', bytes=len(byte_data)):
+        corrected_data, missing = decode_blocks(byte_data, ecc_bytes, rs_workers, confidence)
+    if missing:
+        raise ValueError(f"Blocks {missing} could not be corrected")
+    metrics.count('bytes_decoded_total', len(corrected_data))
+
+    # Unpack the bytes back into bits
+    return np.unpackbits(np.frombuffer(corrected_data, dtype=np.uint8))
 
-def dominant_frequency(signal_value):
+
+def manchester_decoding(bits):
     """
-    This function calculates the dominant frequency in a given signal.
+    This function decodes Manchester encoded bits.
 
     Parameters:
-    signal_value (array): The signal data.
+    bits (array): The Manchester encoded bits.
 
     Returns:
-    float: The dominant frequency.
+    array: The decoded bits, or None if a pair is not a valid Manchester symbol.
     """
-    # Perform a Fast Fourier Transform on the signal
-    yf = fft(signal_value)
+    # View the bits as pairs, a trailing unpaired bit is ignored
+    pairs = np.asarray(bits, dtype=np.uint8)[:len(bits) // 2 * 2].reshape(-1, 2)
+
+    # 01 stands for 0 and 10 for 1, 00 and 11 are invalid
+    invalid = np.count_nonzero(pairs[:, 0] == pairs[:, 1])
+    if invalid:
+        metrics.count('manchester_invalid_pairs_total', invalid)
+        metrics.say("Error: Invalid Manchester Encoding")
+        return None
+
+    return pairs[:, 0].copy()
 
-    # Generate the frequencies corresponding to the FFT coefficients
-    xf = np.linspace(0.0, sample_rate / 2.0, len(signal_value) // 2)
 
-    # Find the peaks in the absolute values of the FFT coefficients
-    peaks, _ = find_peaks(np.abs(yf[0:len(signal_value) // 2]))
+def soft_symbols(low, high):
+    """
+    This function turns the tone energies of symbols into soft decisions.
+    The energies are compared relative to the average energy of their carrier, so a symbol
+    lost in the noise gets a value close to 0 even if one of its tones happens to dominate.
+
+    Parameters:
+    low (array): The energy of the low frequency of every symbol, with one column per carrier.
+    high (array): The energy of the high frequency of every symbol, with one column per carrier.
 
-    # Return the frequency corresponding to the peak with the highest amplitude
-    return xf[peaks[np.argmax(np.abs(yf[0:len(signal_value) // 2][peaks]))]]
+    Returns:
+    array: The soft value of every symbol, around -1 for a clear low frequency and around 1 for a clear high frequency.
+    """
+    scale = np.mean(low + high, axis=0)
+    scale = np.maximum(scale, np.finfo(scale.dtype).tiny)
+    return (high - low) / scale
 
 
-def binary_to_text(binary):
+def manchester_soft_decoding(symbols):
     """
-    This function converts a binary string to text.
+    This function decodes Manchester encoded soft symbols and tells how reliable every bit is.
 
     Parameters:
-    binary (str): The binary string.
+    symbols (array): The soft value of every symbol, around -1 or 1.
 
     Returns:
-    str: The converted text.
+    tuple: The decoded bits, and the confidence of every bit, around 1 for a clear bit and below 0 for the invalid pairs.
+    """
+    with metrics.stage('manchester_decode', symbols=len(symbols)):
+        # View the symbols as pairs, a trailing unpaired symbol is ignored
+        pairs = np.asarray(symbols, dtype=np.float64)[:len(symbols) // 2 * 2].reshape(-1, 2)
+
+        # 10 stands for 1 and 01 for 0, so both symbols of a pair vote for its bit
+        votes = (pairs[:, 0] - pairs[:, 1]) / 2
+        bits = (votes > 0).astype(np.uint8)
+        confidence = np.abs(votes)
+
+        # 00 and 11 are invalid, push their bits below any erasure threshold but keep them ranked by their votes
+        invalid = (pairs[:, 0] > 0) == (pairs[:, 1] > 0)
+        confidence[invalid] -= 1
+
+    metrics.count('manchester_invalid_pairs_total', np.count_nonzero(invalid))
+    return bits, confidence
+
+
+def decode_soft(symbols, ecc=None):
+    """
+    This function decodes the Manchester encoded and Reed-Solomon protected payload of a frame from soft symbols.
+    The bytes holding an invalid or unreliable Manchester pair are erased before Reed-Solomon decoding.
+
+    Parameters:
+    symbols (array): The soft value of every symbol of the payload, around -1 or 1.
+    ecc (int): The number of error correction bytes per block, ecc_bytes if None.
+
+    Returns:
+    array: The decoded bits.
+    """
+    if ecc is None:
+        ecc = profiles.ecc_bytes
+
+    decoded_bits, confidence = manchester_soft_decoding(symbols)
+
+    # Drop the incomplete byte formed by the padding of the last multi-carrier symbol
+    length = len(decoded_bits) // 8 * 8
+    decoded_bits = decoded_bits[:length]
+
+    # A byte is as reliable as its least reliable bit
+    byte_confidence = confidence[:length].reshape(-1, 8).min(axis=1)
+
+    # Decode the bits
+    return decode_rs(decoded_bits, ecc, byte_confidence)
+
+
+def decode_header(data, start_sample, sr):
+    """
+    This function reads the frame header sent right after the start flag.
+
+    Parameters:
+    data (array): The filtered audio data.
+    start_sample (int): The index of the first sample after the start flag.
+    sr (int): The sample rate of the audio.
+
+    Returns:
+    tuple: The profile the payload is sent with (0 for the bit_duration and ecc_bytes parameters) and the number of carriers.
+    """
+    samples_per_symbol = int(sr * profiles.bit_duration)
+
+    # The header is always sent on the single low/high frequency pair at bit_duration
+    with metrics.stage('header'):
+        bits = demodulate(data, start_sample, start_sample + 2 * profiles.header_bits * samples_per_symbol, sr)
+        header = manchester_decoding(bits)
+
+    if header is None or len(header) != profiles.header_bits:
+        raise ValueError("Invalid frame header")
+
+    # The profile takes the 4 high bits and the number of carriers the 4 low bits
+    value = int(np.packbits(header)[0])
+    profile, carriers = value >> 4, value & 0x0F
+    if carriers == 0 or (profile != 0 and profile not in profile_table):
+        raise ValueError("Invalid frame header")
+
+    # The sender fits the carriers of a profile at its own sample rate, the header must agree with it
+    expected = profile_settings(profile, carriers)[2]
+    if carriers != expected:
+        raise ValueError(f"Invalid frame header: {carriers} carriers, profile {profile} is sent on {expected}")
+
+    return profile, carriers
+
+
+def demodulate_payload(data, start_sample, end_sample, sr, profile, carriers):
+    """
+    This function demodulates the payload of the frame between the start and end flags into soft symbols.
+
+    Parameters:
+    data (array): The filtered audio data.
+    start_sample (int): The index of the first sample after the start flag.
+    end_sample (int): The index of the first sample of the end flag.
+    sr (int): The sample rate of the audio.
+    profile (int): The profile read from the header.
+    carriers (int): The number of carriers read from the header, the payload is demodulated on these.
+
+    Returns:
+    array: The soft value of every symbol of the payload around -1 or 1, still Manchester and Reed-Solomon encoded.
+    """
+    duration = profile_settings(profile, carriers)[0]
+
+    # Measure the payload symbols between the header and the end flag while following their timing
+    payload_start = start_sample + 2 * profiles.header_bits * int(sr * profiles.bit_duration)
+    with metrics.stage('demodulation', samples=end_sample - payload_start) as fields:
+        low, high = track_symbols(data, payload_start, end_sample, sr, carriers, duration)
+        fields['symbols'] = low.size
+    metrics.count('symbols_demodulated_total', low.size)
+
+    # Plot the tone energies in the background if the diagnostics are on
+    diagnostics.energies(low, high)
+
+    # Compare the tones of every carrier of every symbol
+    return soft_symbols(low, high).reshape(-1)
+
+
+def demodulate_frame_soft(data, start_sample, end_sample, sr):
+    """
+    This function demodulates the header and payload of the frame between the start and end flags into soft symbols.
+
+    Parameters:
+    data (array): The filtered audio data.
+    start_sample (int): The index of the first sample after the start flag.
+    end_sample (int): The index of the first sample of the end flag.
+    sr (int): The sample rate of the audio.
+
+    Returns:
+    array: The soft value of every symbol of the payload around -1 or 1, still Manchester and Reed-Solomon encoded.
+    """
+    # Read the profile and the number of carriers from the header
+    profile, carriers = decode_header(data, start_sample, sr)
+
+    return demodulate_payload(data, start_sample, end_sample, sr, profile, carriers)
+
+
+def decode_frame(data, start_sample, end_sample, sr):
+    """
+    This function decodes the frame between the start and end flags.
+
+    Parameters:
+    data (array): The filtered audio data.
+    start_sample (int): The index of the first sample after the start flag.
+    end_sample (int): The index of the first sample of the end flag.
+    sr (int): The sample rate of the audio.
+
+    Returns:
+    array: The decoded bits.
+    """
+    profile, carriers = decode_header(data, start_sample, sr)
+    symbols = demodulate_payload(data, start_sample, end_sample, sr, profile, carriers)
+
+    # Decode with the error correction of the profile
+    decoded_bits = decode_soft(symbols, profile_settings(profile, carriers)[1])
+    metrics.count('frames_decoded_total', profile=profile)
+    return decoded_bits
+
+
+def signal_to_binary_between_times(data, sr):
+    """
+    This function converts the signal between the start and end flags to bits.
+
+    Parameters:
+    data (array): The filtered audio data.
+    sr (int): The sample rate of the audio.
+
+    Returns:
+    array: The decoded bits.
+    """
+    # Get the position of the frame
+    start_sample, end_sample, confidence = frame_analyse(data, sr)
+
+    # Decode the frame between the flags
+    return decode_frame(data, start_sample, end_sample, sr)
+
+
+def first_channel(data):
+    """
+    This function returns the first channel of multichannel audio data.
+
+    Parameters:
+    data (array): The audio data, with one column per channel if it has more than one.
+
+    Returns:
+    array: The samples of the first channel.
+    """
+    data = np.asarray(data)
+    if data.ndim > 1:
+        return data[:, 0]
+    return data
+
+
+def decode(data, sr=profiles.sample_rate):
+    """
+    This function decodes the text sent in an audio signal.
+
+    Parameters:
+    data (array): The audio data.
+    sr (int): The sample rate of the audio.
+
+    Returns:
+    str: The received text.
+    """
+    # Apply the bandpass filter to the first channel of the audio data
+    filtered_data = butter_bandpass_filter(first_channel(data), sr, profiles.filter_band)
+
+    # Convert the audio signal to bits
+    audio_receive = signal_to_binary_between_times(filtered_data, sr)
+
+    # Convert the bits to text
+    return binary_to_text(audio_receive)
+
+
+def decode_segment(segment, end_sample, sr, binary=False):
+    """
+    This function decodes a frame cut out of a capture, so frames can be decoded in other processes.
+
+    Parameters:
+    segment (array): The filtered audio data, starting right after the start flag.
+    end_sample (int): The index of the first sample of the end flag in the segment.
+    sr (int): The sample rate of the audio.
+    binary (bool): Whether to return the payload as bytes instead of text.
+
+    Returns:
+    str: The received text (bytes if binary), or an error message.
     """
     try:
-        # Convert each 8-bit binary number to a character and join them together
-        return ''.join(chr(int(binary[i:i + 8], 2)) for i in range(0, len(binary), 8))
+        decoded_bits = decode_frame(segment, 0, end_sample, sr)
+        if binary:
+            return binary_to_payload(decoded_bits)[0]
+        return binary_to_text(decoded_bits)
     except Exception as e:
         # If an error occurs, return an error message
+        metrics.count('frames_failed_total')
         return f"Error: {e}"
 
 
-def decode_rs(binary_string, ecc_bytes):
+def frame_segments(data, sr):
     """
-    This function decodes a Reed-Solomon encoded binary string.
+    This function cuts every frame out of a capture, so the frames can be decoded independently.
 
     Parameters:
-    binary_string (str): The binary string.
-    ecc_bytes (int): The number of error correction bytes used in the encoding.
+    data (array): The audio data.
+    sr (int): The sample rate of the audio.
 
     Returns:
-    str: The decoded binary string.
+    list: The filtered audio data of every frame starting right after its start flag, and the index of its end flag.
     """
-    # Convert the binary string to a bytearray
-    byte_data = bytearray(int(binary_string[i:i + 8], 2) for i in range(0, len(binary_string), 8))
+    # Apply the bandpass filter to the first channel of the audio data
+    filtered_data = butter_bandpass_filter(first_channel(data), sr, profiles.filter_band)
 
-    # Initialize a Reed-Solomon codec
-    rs = reedsolo.RSCodec(ecc_bytes)
+    # Keep the longest symbol of any profile after the end flag for the timing recovery
+    margin = int(sr * max([profiles.bit_duration] + [settings['bit_duration'] for settings in profile_table.values()]))
+    return [(filtered_data[start_sample:end_sample + margin], end_sample - start_sample)
+            for start_sample, end_sample, confidence in find_frames(filtered_data, sr)]
 
-    # Decode the bytearray
-    corrected_data_tuple = rs.decode(byte_data)
-    corrected_data = corrected_data_tuple[0]
 
-    # Remove trailing null bytes
-    corrected_data = corrected_data.rstrip(b'\x00')
+def decode_all(data, sr=profiles.sample_rate, workers=None):
+    """
+    This function decodes every message sent in an audio signal, the frames being decoded in parallel.
 
-    # Convert the bytearray back to a binary string
-    corrected_binary_string = ''.join(format(byte, '08b') for byte in corrected_data)
+    Parameters:
+    data (array): The audio data.
+    sr (int): The sample rate of the audio.
+    workers (int): The number of processes, 1 decodes in this process.
+
+    Returns:
+    list: The received text of each message, or an error message, in order.
+    """
+    segments = frame_segments(data, sr)
+
+    # Only start processes when there is more than one frame
+    if len(segments) < 2 or workers == 1:
+        return [decode_segment(segment, end_sample, sr) for segment, end_sample in segments]
 
-    return corrected_binary_string
+    # Bring the metrics of every frame back from the worker processes, which inherit what every profile needs
+    prepare(sr)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(metrics.measured, repeat(decode_segment), *zip(*segments), repeat(sr)))
+    for text, collected in results:
+        metrics.merge(collected)
+    return [text for text, collected in results]
 
 
-def manchester_decoding(binary_string):
+def frame_report(data, start_sample, end_sample, confidence, sr):
     """
-    This function decodes a Manchester encoded binary string.
+    This function decodes a frame and measures the conditions it was received in, so the sender can adapt to them.
 
     Parameters:
-    binary_string (str): The binary string.
+    data (array): The filtered audio data.
+    start_sample (int): The index of the first sample after the start flag.
+    end_sample (int): The index of the first sample of the end flag.
+    confidence (float): The confidence of the detection of the flags.
+    sr (int): The sample rate of the audio.
 
     Returns:
-    str: The decoded binary string.
+    dict: The time of the frame, the confidence, the version of the profiles it was decoded with, the SNR of each band,
+    the profile and carriers it was sent with, the profile the sender should use next, and the received text or an error message.
     """
-    decoded_string = ''
-    for i in tqdm(range(0, len(binary_string), 2), desc="Decoding"):
-        if i + 1 < len(binary_string):
-            if binary_string[i] == '0' and binary_string[i + 1] == '1':
-                decoded_string += '0'
-            elif binary_string[i] == '1' and binary_string[i + 1] == '0':
-                decoded_string += '1'
-            else:
-                print("Error: Invalid Manchester Encoding")
-                return None
-    return decoded_string
+    report = {'time': start_sample / sr, 'confidence': confidence, 'version': profiles.version}
+    try:
+        snr = estimate_snr(data, start_sample, sr)
+        report['snr_db'] = [float(value) for value in snr]
+        for band, value in zip(('low', 'high'), report['snr_db']):
+            metrics.observe('snr_db', value, band=band)
+        report['next_profile'] = select_profile(float(snr.min()))
+    except ValueError:
+        # The frame starts too early in the capture to measure the noise before it
+        report['snr_db'] = None
+        report['next_profile'] = None
+
+    try:
+        report['profile'], report['carriers'] = decode_header(data, start_sample, sr)
+        report['text'] = binary_to_text(decode_frame(data, start_sample, end_sample, sr))
+    except Exception as e:
+        # If an error occurs, report an error message
+        metrics.count('frames_failed_total')
+        report['text'] = f"Error: {e}"
 
+    metrics.event('frame', **report)
+    return report
 
-def signal_to_binary_between_times(filename):
+
+def analyse(data, sr=profiles.sample_rate):
     """
-    This function converts a signal to a binary string between specified times.
+    This function decodes every message sent in an audio signal and reports the conditions each one was received in.
 
     Parameters:
-    filename (str): The path to the audio file.
+    data (array): The audio data.
+    sr (int): The sample rate of the audio.
 
     Returns:
-    str: The binary string.
+    list: The report of every frame, see frame_report, in order.
     """
-    # Get the start and end times of the signal of interest
-    start_time, end_time = frame_analyse(filename)
+    # Apply the bandpass filter to the first channel of the audio data
+    filtered_data = butter_bandpass_filter(first_channel(data), sr, profiles.filter_band)
 
-    # Read the audio file
-    sr, data = read(filename)
+    return [frame_report(filtered_data, start_sample, end_sample, confidence, sr)
+            for start_sample, end_sample, confidence in find_frames(filtered_data, sr)]
 
-    # Calculate the start and end samples of the signal of interest
-    start_sample = int((start_time - 0.007) * sr)
-    end_sample = int((end_time - 0.007) * sr)
-    binary_string = ''
-
-    # Convert each sample to a binary digit
-    for i in tqdm(range(start_sample, end_sample, int(sr * bit_duration))):
-        signal_value = data[i:i + int(sr * bit_duration)]
-        frequency = dominant_frequency(signal_value)
-        if np.abs(frequency - low_frequency) < np.abs(frequency - high_frequency):
-            binary_string += '0'
-        else:
-            binary_string += '1'
-
-    # Find the start and end indices of the binary string
-    index_start = binary_string.find("1000001")
-    substrings = ["0111110", "011110"]
-    index_end = -1
-    for substring in substrings:
-        index = binary_string.find(substring)
-        if index != -1:
-            index_end = index
-            break
 
-    print("Binary String:", binary_string)
-    binary_string_decoded = manchester_decoding(binary_string[index_start + 7:index_end])
+def report(audio=None):
+    """
+    This function reports the SNR and the profile to send with next for every message of the recorded audio.
 
-    # Decode the binary string
-    decoded_binary_string = decode_rs(binary_string_decoded, 20)
+    Parameters:
+    audio (tuple): The sample rate and the audio data, the recorded audio file is read if None.
 
-    return decoded_binary_string
+    Returns:
+    str: One line per message.
+    """
+    try:
+        if audio is None:
+            with metrics.stage('wav_read'):
+                audio = read(recorded_file)
+        sr, data = audio
+        metrics.count('samples_read_total', len(data))
+        lines = []
+        for frame in analyse(data, sr):
+            if frame['snr_db'] is None:
+                lines.append(f"{frame['time']:.2f} s: SNR unknown, {frame['text']}")
+                continue
+            low, high = frame['snr_db']
+            name = profile_table[frame['next_profile']]['name']
+            lines.append(f"{frame['time']:.2f} s: SNR {low:.1f} / {high:.1f} dB, send with '{name}' next, {frame['text']}")
+
+        if not lines:
+            return "Error: No message found"
+
+        return "\n".join(lines)
+    except Exception as e:
+        # If an error occurs, return an error message
+        return f"Error: {e}"
 
 
 def receive():
     """
-    This function receives an audio signal, converts it to a binary string, and then converts the binary string to text.
+    This function reads the recorded audio file and decodes every message sent in it.
 
     Returns:
-    str: The received text.
+    str: The received texts, one per line.
     """
     try:
-        # Convert the audio signal to a binary string
-        audio_receive = signal_to_binary_between_times('output_filtered_receiver.wav')
+        messages = list(scan(recorded_file))
+        if not messages:
+            return "Error: No message found"
 
-        # Convert the binary string to text
-        return binary_to_text(audio_receive)
+        return "\n".join(messages)
     except Exception as e:
         # If an error occurs, return an error message
         return f"Error: {e}"
 
 
+# -----------------Profiles----------------- #
+
+def prepare(sr=profiles.sample_rate):
+    """
+    This function computes once what receiving the frames of every profile needs: the filter, the flag references,
+    the tone references and the Reed-Solomon codecs. Worker processes started afterwards inherit them.
+
+    Parameters:
+    sr (int): The sample rate of the audio.
+
+    Returns:
+    None
+    """
+    dtype = np.dtype(filters.working_dtype)
+    flag_reference(0, sr)
+    flag_reference(1, sr)
+    tone_references(sr, int(sr * profiles.flag_duration), dtype)
+    tone_references(sr, int(sr * profiles.bit_duration), dtype)
+
+    # Multicarrier symbols are measured with an FFT, only single carrier ones need tone references
+    for profile in [0] + list(profile_table):
+        duration, ecc, carriers = profile_settings(profile, sr=sr)
+        if carriers == 1:
+            tone_references(sr, int(sr * duration), dtype)
+        rs_codec(ecc)
+
+
+# -----------------Stream----------------- #
+
+def microphone_blocks(block_size, sr=profiles.sample_rate, device=None):
+    """
+    This function reads blocks of audio from the microphone.
+
+    Parameters:
+    block_size (int): The number of samples in each block.
+    sr (int): The sample rate of the audio.
+    device (int or str): The input device, the default device is used if None.
+
+    Yields:
+    array: The next block of audio.
+    """
+    # Import sounddevice here, as it needs PortAudio which headless machines may not have
+    import sounddevice as sd
+
+    with sd.InputStream(samplerate=sr, blocksize=block_size, device=device, channels=1, dtype='float32') as stream:
+        while True:
+            block, overflowed = stream.read(block_size)
+            if overflowed:
+                metrics.count('input_overflows_total')
+                metrics.say("Warning: Input overflow, samples were lost")
+            yield block[:, 0]
+
+
+def append_samples(buffer, length, block):
+    """
+    This function appends a block of samples to a buffer whose capacity doubles when it is full,
+    so a long frame received in small blocks is not copied again with every block.
+
+    Parameters:
+    buffer (array): The buffer, holding samples up to length.
+    length (int): The number of samples in the buffer.
+    block (array): The samples to append.
+
+    Returns:
+    tuple: The buffer, reallocated if it was too small, and the new number of samples in it.
+    """
+    end = length + len(block)
+    if end > len(buffer):
+        grown = np.empty(max(end, 2 * len(buffer)), dtype=buffer.dtype)
+        grown[:length] = buffer[:length]
+        buffer = grown
+
+    buffer[length:end] = block
+    return buffer, end
+
+
+def stream_receive(blocks, sr=profiles.sample_rate, max_frame_duration=None, executor=None, binary=False):
+    """
+    This function decodes the messages of a stream of audio blocks as soon as their end flag arrives.
+
+    Parameters:
+    blocks (iterable): The blocks of audio, as arrays of samples.
+    sr (int): The sample rate of the audio.
+    max_frame_duration (float): The duration after which a frame without end flag is abandoned, no limit if None.
+    executor (Executor): An optional pool the frames are decoded in while the stream is scanned, the messages keep their order.
+    binary (bool): Whether to give the payloads as bytes instead of text.
+
+    Yields:
+    str: The received text (bytes if binary) of each message, or an error message, also for a frame without end flag.
+    """
+    start_reference = flag_reference(0, sr)
+    end_reference = flag_reference(1, sr)
+    buffer = np.zeros(0, dtype=filters.working_dtype)
+    length = 0
+    search_from = 0
+    in_frame = False
+    margin = int(sr * max([profiles.bit_duration] + [settings['bit_duration'] for settings in profile_table.values()]))
+    pending = deque()
+
+    # Filter the blocks, carrying the filter state over from one block to the next
+    filtered_blocks = filter_chunks((first_channel(block) for block in blocks), sr, profiles.filter_band)
+
+    for filtered_block in filtered_blocks:
+        buffer, length = append_samples(buffer, length, filtered_block)
+
+        while True:
+            # The samples received and not dropped yet, the rest of the buffer is free space
+            data = buffer[:length]
+
+            if not in_frame:
+                # Look for the start flag
+                index, score, search_from = find_flag(data, start_reference, search_from)
+                if index is None:
+                    # Drop the samples that can no longer be part of a start flag
+                    buffer = buffer[search_from:]
+                    length -= search_from
+                    search_from = 0
+                    break
+
+                # Keep only the samples after the start flag
+                metrics.count('frames_detected_total')
+                metrics.observe('sync_confidence', score)
+                buffer = buffer[index + len(start_reference):]
+                length -= index + len(start_reference)
+                search_from = 0
+                in_frame = True
+            else:
+                # Look for the end flag
+                index, score, search_from = find_flag(data, end_reference, search_from)
+                if index is None:
+                    if max_frame_duration is not None and length > max_frame_duration * sr:
+                        # Abandon a frame whose end flag never came, after the messages before it
+                        metrics.count('frames_failed_total')
+                        while pending:
+                            yield merged(pending.popleft())
+                        yield f"Error: No end flag within {max_frame_duration:g} s of the start flag, the frame was abandoned"
+
+                        buffer = buffer[search_from:]
+                        length -= search_from
+                        search_from = 0
+                        in_frame = False
+                    break
+
+                # Decode the frame between the flags, with one symbol after the end flag for the timing recovery
+                if executor is None:
+                    yield decode_segment(data[:index + margin], index, sr, binary)
+                else:
+                    pending.append(executor.submit(metrics.measured, decode_segment, data[:index + margin], index, sr,
+                                                   binary))
+
+                # Keep only the samples after the end flag
+                buffer = buffer[index + len(end_reference):]
+                length -= index + len(end_reference)
+                search_from = 0
+                in_frame = False
+
+        # Give the decoded messages in order, and wait for the oldest frame if too many are pending
+        while pending and (pending[0].done() or len(pending) > max_pending_frames):
+            yield merged(pending.popleft())
+
+    # Wait for the frames still being decoded
+    while pending:
+        yield merged(pending.popleft())
+
+    if in_frame:
+        metrics.count('frames_failed_total')
+        yield "Error: The audio ended before the end flag of the last frame"
+
+
+def merged(future):
+    """
+    This function waits for a frame decoded in a pool and brings its metrics back.
+
+    Parameters:
+    future (Future): The pending result of metrics.measured.
+
+    Returns:
+    str: The received text, or an error message.
+    """
+    text, collected = future.result()
+    metrics.merge(collected)
+    return text
+
+
+def listen(block_duration=0.1, device=None, max_frame_duration=listen_max_frame_duration):
+    """
+    This function decodes the messages received by the microphone.
+
+    Parameters:
+    block_duration (float): The duration of each block read from the microphone.
+    device (int or str): The input device, the default device is used if None.
+    max_frame_duration (float): The duration after which a frame without end flag is abandoned, no limit if None.
+
+    Yields:
+    str: The received text of each message, or an error message.
+    """
+    blocks = microphone_blocks(int(profiles.sample_rate * block_duration), device=device)
+    yield from stream_receive(blocks, max_frame_duration=max_frame_duration)
+
+
+def wav_blocks(path, block_duration=scan_block_duration):
+    """
+    This function opens a WAV file memory-mapped and splits it into blocks, so only the block being read is loaded.
+
+    Parameters:
+    path (str): The path of the WAV file.
+    block_duration (float): The duration of one block.
+
+    Returns:
+    tuple: The sample rate of the audio and a generator of the blocks.
+    """
+    with metrics.stage('wav_read'):
+        try:
+            sr, data = read(path, mmap=True)
+        except ValueError:
+            # Some sample formats, like 24-bit, cannot be memory-mapped
+            sr, data = read(path)
+    metrics.count('samples_read_total', len(data))
+
+    block_size = max(int(sr * block_duration), 1)
+    return sr, (data[start:start + block_size] for start in range(0, len(data), block_size))
+
+
+def scan(path, block_duration=scan_block_duration, max_frame_duration=None, workers=None, binary=False):
+    """
+    This function decodes every message of a WAV file of any length.
+    The file is memory-mapped and scanned block by block, like a stream, so the memory used depends on
+    the longest frame and not on the length of the recording. Frames are decoded in parallel while the scan goes on.
+
+    Parameters:
+    path (str): The path of the WAV file.
+    block_duration (float): The duration of audio read at once.
+    max_frame_duration (float): The duration after which a frame without end flag is abandoned, no limit if None,
+    the file bounding the frame already.
+    workers (int): The number of processes decoding frames, 1 decodes in this process.
+    binary (bool): Whether to give the payloads as bytes instead of text.
+
+    Yields:
+    str: The received text (bytes if binary) of each message, or an error message.
+    """
+    sr, blocks = wav_blocks(path, block_duration)
+    if workers == 1:
+        yield from stream_receive(blocks, sr, max_frame_duration, binary=binary)
+        return
+
+    # Start the workers with what every profile needs already computed
+    prepare(sr)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from stream_receive(blocks, sr, max_frame_duration, executor, binary)
+
+
 # -----------------Interface----------------- #
 
-# Start a Gradio Blocks interface
-with gr.Blocks() as demo:
-    input_audio = gr.Audio(sources=["upload"])
-    output_text = gr.Textbox(label="Record Sound")
-    btn_convert = gr.Button(value="Convert")
-    btn_convert.click(fn=record, inputs=input_audio, outputs=output_text)
+def interface():
+    """
+    This function builds the Gradio interface of the receiver.
+
+    Returns:
+    Blocks: The interface, ready to be launched.
+    """
+    # Import gradio here so decoding without the interface does not load it
+    import gradio as gr
+    from async_api import offloaded, receive_async
+
+    async def receive_with_progress(audio, progress=gr.Progress()):
+        if audio is None:
+            return "Error: No audio uploaded"
+        return await receive_async(lambda stage, done, total: progress(done / max(total, 1), desc=stage), audio)
+
+    async def report_uploaded(audio):
+        if audio is None:
+            return "Error: No audio uploaded"
+        return await offloaded(report)(audio)
+
+    # Start a Gradio Blocks interface, the uploaded audio is handed to the handlers so no file is shared between users
+    with gr.Blocks() as demo:
+        input_audio = gr.Audio(sources=["upload"])
+
+        output_convert = gr.Textbox(label="Received Text")
+        btn_receive = gr.Button(value="Received Text")
+        btn_receive.click(fn=receive_with_progress, inputs=input_audio, outputs=output_convert)
+
+        output_report = gr.Textbox(label="Channel Report")
+        btn_report = gr.Button(value="Measure Channel")
+        btn_report.click(fn=report_uploaded, inputs=input_audio, outputs=output_report)
+
+    # The signal processing runs in a pool and every request keeps its audio in memory, so the handlers of many users
+    # can run at the same time
+    demo.queue(default_concurrency_limit=None)
+    return demo
 
-    output_convert = gr.Textbox(label="Received Text")
-    btn_receive = gr.Button(value="Received Text")
-    btn_receive.click(fn=receive, outputs=output_convert)
 
-demo.launch()
+if __name__ == '__main__':
+    metrics.verbose = True
+    interface().launch()
@@ -1,22 +1,21 @@
 import numpy as np
-from scipy.io.wavfile import write, read
-from tqdm import tqdm
-import gradio as gr
-from scipy.signal import butter, lfilter
-import reedsolo
+from scipy.io.wavfile import write
+import filters
+from filters import butter_bandpass_filter, filter_order, to_int16
+from framing import encode_blocks, block_size, rs_codec
+from waveforms import waveform_key, lookup, store
+from multicarrier import carrier_frequencies, max_carriers
+import profiles
+from profiles import profile_table, profile_settings, describe, select_profile, max_profile
+import payload
+import metrics
 import os
+from functools import lru_cache
 
 # ---------------Parameters--------------- #
 
-input_file = 'input_text.wav'
 output_file = 'output_filtered_sender.wav'
 
-low_frequency = 18000
-high_frequency = 19000
-bit_duration = 0.007
-sample_rate = 44100
-amplitude_scaling_factor = 15.0
-
 
 # ----------------Useless----------------  #
 
@@ -35,293 +34,526 @@ def delete_file(file_path):
         os.remove(file_path)
 
         # If successful, print a success message
-        print(f"File '{file_path}' deleted successfully.")
+        metrics.say(f"File '{file_path}' deleted successfully.")
     except OSError as e:
         # If an error occurs (like the file does not exist), print an error message
-        print(f"Error deleting file '{file_path}': {e}")
+        metrics.say(f"Error deleting file '{file_path}': {e}")
 
 
-# -----------------Filter----------------- #
+# -----------------Sender----------------- #
 
-def butter_bandpass(sr, order=5):
+def payload_to_binary(message, compression=None):
     """
-    This function designs a Butterworth bandpass filter.
+    This function converts a message to the bits of its payload.
 
     Parameters:
-    sr (int): The sample rate of the audio.
-    order (int): The order of the filter.
+    message (str or bytes): The message, a text string is sent as UTF-8.
+    compression (str): 'none', 'zlib', 'dictionary' or 'auto', the compression parameter of the payload module if None.
 
     Returns:
-    tuple: The filter coefficients `b` and `a`.
+    array: The bits as uint8, starting with the payload header.
     """
-    # Calculate the Nyquist frequency
-    nyquist = 0.5 * sr
+    text = isinstance(message, str)
+    data = message.encode('utf-8') if text else bytes(message)
 
-    # Normalize the cutoff frequencies with a 500 Hz offset
-    low = (low_frequency - 500) / nyquist
-    high = (high_frequency + 500) / nyquist
+    # Add the header telling the receiver how the payload is compressed and whether it is text
+    packed = payload.pack(data, text, compression)
 
-    # Design the Butterworth bandpass filter
-    coef = butter(order, [low, high], btype='band')
+    return np.unpackbits(np.frombuffer(packed, dtype=np.uint8))
 
-    # Extract the filter coefficients
-    b = coef[0]
-    a = coef[1]
 
-    return b, a
-
-
-def butter_bandpass_filter(data, sr, order=5):
+def text_to_binary(text, compression=None):
     """
-    This function applies the Butterworth bandpass filter to a given data.
+    This function converts a text string to bits.
 
     Parameters:
-    data (array): The audio data to be filtered.
-    sr (int): The sample rate of the audio.
-    order (int): The order of the filter.
+    text (str): The text string.
+    compression (str): 'none', 'zlib', 'dictionary' or 'auto', the compression parameter of the payload module if None.
 
     Returns:
-    array: The filtered audio data.
+    array: The bits as uint8, the payload header followed by the UTF-8 text, compressed or not.
+    """
+    return payload_to_binary(text, compression)
+
+
+def signal_function(frequency, time):
     """
-    # Get the filter coefficients
-    b, a = butter_bandpass(sr, order=order)
+    This function generates a sinusoidal signal with a given frequency and time.
 
-    # Apply the filter to the data
-    y = lfilter(b, a, data)
+    Parameters:
+    frequency (float): The frequency of the signal.
+    time (array): The time values for the signal.
 
-    return y
+    Returns:
+    array: The generated signal.
+    """
+    # Return a sinusoidal signal with the given frequency and time
+    return np.sin(2 * np.pi * frequency * time)
 
 
-def filtered():
+def generate_silence(duration):
     """
-    This function reads an audio file, applies the bandpass filter to the audio data,
-    and then writes the filtered data to an output file.
+    This function generates a silence signal with a given duration.
+
+    Parameters:
+    duration (float): The duration of the silence.
 
     Returns:
-    str: A success message if the audio is filtered correctly, otherwise an error message.
+    array: The silence signal.
     """
-    # Read the audio data from the input file
-    sr, data = read(input_file)
+    # Return a zero signal with the length corresponding to the given duration
+    return np.zeros(int(profiles.sample_rate * duration), dtype=filters.working_dtype)
 
-    # Apply the bandpass filter to the audio data
-    filtered_data = butter_bandpass_filter(data, sr)
 
-    # Write the filtered data to the output file
-    write(output_file, sr, np.int16(filtered_data))
+def bits_from_string(binary_string):
+    """
+    This function converts a binary string to an array of bit values.
 
-    return "Filtered Audio Generated"
+    Parameters:
+    binary_string (str): The binary string.
 
+    Returns:
+    array: The bit values (0 or 1) as uint8.
+    """
+    # Read the ASCII codes of the characters and subtract the code of '0'
+    return np.frombuffer(binary_string.encode('ascii'), dtype=np.uint8) - ord('0')
 
-# -----------------Sender----------------- #
 
-def text_to_binary(text):
+def as_bits(binary):
     """
-    This function converts a text string to a binary string.
+    This function accepts bits as an array or as a binary string.
 
     Parameters:
-    text (str): The text string.
+    binary (array or str): The bits.
 
     Returns:
-    str: The binary string.
+    array: The bit values (0 or 1) as uint8.
     """
-    # Convert each character in the text to its ASCII value, format it as an 8-bit binary number, and join them together
-    binary_string = ''.join(format(ord(char), '08b') for char in text)
-    return binary_string
+    if isinstance(binary, str):
+        return bits_from_string(binary)
+    return np.asarray(binary, dtype=np.uint8)
 
 
-def signal_function(frequency, time):
+@lru_cache(maxsize=None)
+def symbol_templates(sr, duration, amplitude, dtype=np.float64):
     """
-    This function generates a sinusoidal signal with a given frequency and time.
+    This function generates the low and high frequency symbol templates once for a sample rate, duration and amplitude.
 
     Parameters:
-    frequency (float): The frequency of the signal.
-    time (array): The time values for the signal.
+    sr (int): The sample rate of the audio.
+    duration (float): The duration of one symbol.
+    amplitude (float): The amplitude of the square waves.
+    dtype (dtype): The floating point type of the templates.
 
     Returns:
-    array: The generated signal.
+    array: A read-only array with the low frequency symbol in row 0 and the high frequency symbol in row 1.
     """
-    # Return a sinusoidal signal with the given frequency and time
-    return np.sin(2 * np.pi * frequency * time)
+    # Generate the time values for one symbol
+    t = np.linspace(0, duration, int(sr * duration), False)
 
+    # Generate both square waves in a single call
+    frequencies = np.array([[profiles.low_frequency], [profiles.high_frequency]])
+    templates = (amplitude * np.sign(signal_function(frequencies, t))).astype(dtype)
 
-def generate_silence(duration):
+    # The templates are shared between calls, so protect them from modification
+    templates.setflags(write=False)
+    return templates
+
+
+def modulate(bits, duration=None, out=None):
     """
-    This function generates a silence signal with a given duration.
+    This function converts a sequence of bits to a signal by indexing the symbol templates.
 
     Parameters:
-    duration (float): The duration of the silence.
+    bits (array): The bit values (0 selects the low frequency, 1 the high frequency).
+    duration (float): The duration of one symbol, bit_duration if None.
+    out (array): An optional buffer the signal is written into, of length len(bits) * samples per symbol.
 
     Returns:
-    array: The silence signal.
+    array: The signal.
     """
-    # Return a zero signal with the length corresponding to the given duration
-    return np.zeros(int(sample_rate * duration))
+    if duration is None:
+        duration = profiles.bit_duration
+
+    templates = symbol_templates(profiles.sample_rate, duration, profiles.amplitude_scaling_factor, filters.working_dtype)
+    bits = np.asarray(bits, dtype=np.intp)
 
+    if out is None:
+        # Gather one template per bit and flatten the result into one signal
+        return templates[bits].reshape(-1)
 
-def binary_signal(binary_string):
+    # Gather the templates directly into the caller's buffer
+    np.take(templates, bits, axis=0, out=out.reshape(len(bits), templates.shape[1]))
+    return out
+
+
+def binary_signal(bits):
     """
-    This function converts a binary string to a signal.
+    This function converts bits to a signal.
 
     Parameters:
-    binary_string (str): The binary string.
+    bits (array): The bits.
 
     Returns:
     array: The signal.
     """
-    # Generate the time values for the signal
-    t = np.linspace(0, bit_duration, int(sample_rate * bit_duration), False)
-    signal = []
+    # Select the low or high frequency template for every bit at once
+    return modulate(as_bits(bits))
 
-    # For each bit in the binary string, generate a signal with the low or high frequency depending on the bit value
-    for bit in tqdm(binary_string, desc="Generating Signal"):
-        if bit == '0':
-            signal.append(amplitude_scaling_factor * np.sign(signal_function(low_frequency, t)))
-        else:
-            signal.append(amplitude_scaling_factor * np.sign(signal_function(high_frequency, t)))
 
-    # Concatenate the generated signals into one signal
-    return np.concatenate(signal)
+def flag_bits(bit_value):
+    """
+    This function returns the bits of the start or end flag.
+
+    Parameters:
+    bit_value (int): The bit value (0 for the start flag, 1 for the end flag).
+
+    Returns:
+    array: The flag bits.
+    """
+    # Depending on the bit value, return the corresponding binary flag
+    if bit_value == 0:
+        return bits_from_string("100001")
+    else:
+        return bits_from_string("011110")
 
 
-def flag_encoding(bit_value):
+def flag_encoding(bit_value, out=None):
     """
     This function encodes a bit value into a flag signal.
 
     Parameters:
     bit_value (int): The bit value (0 or 1).
+    out (array): An optional buffer the flag signal is written into.
 
     Returns:
     array: The flag signal.
     """
-    # Generate the time values for the flag signal
-    flag_duration = 6 * 0.0014
-    t_flag = np.linspace(0, flag_duration, int(sample_rate * flag_duration), False)
-    signal = []
+    return modulate(flag_bits(bit_value), profiles.flag_duration, out=out)
 
-    # Depending on the bit value, generate a flag signal with the corresponding binary flag
-    if bit_value == 0:
-        binary_flag = "100001"
-        for bit in binary_flag:
-            if bit == '0':
-                signal.append(amplitude_scaling_factor * np.sign(signal_function(low_frequency, t_flag)))
-            else:
-                signal.append(amplitude_scaling_factor * np.sign(signal_function(high_frequency, t_flag)))
-
-        return np.concatenate(signal)
-    else:
-        binary_flag = "011110"
-        for bit in tqdm(binary_flag, desc="Generating Signal"):
-            if bit == '0':
-                signal.append(amplitude_scaling_factor * np.sign(signal_function(low_frequency, t_flag)))
-            else:
-                signal.append(amplitude_scaling_factor * np.sign(signal_function(high_frequency, t_flag)))
 
-        return np.concatenate(signal)
+@lru_cache(maxsize=None)
+def carrier_templates(sr, duration, carriers, amplitude, dtype=np.float64):
+    """
+    This function generates the symbol templates of every tone of parallel carriers once.
+
+    Parameters:
+    sr (int): The sample rate of the audio.
+    duration (float): The duration of one symbol.
+    carriers (int): The number of carriers.
+    amplitude (float): The amplitude of all the carriers together.
+    dtype (dtype): The floating point type of the templates.
+
+    Returns:
+    array: A read-only (2 * carriers, samples per symbol) array with the low tones first and the high tones after.
+    """
+    # Generate the time values for one symbol
+    t = np.arange(int(sr * duration)) / sr
+
+    # Give every tone a different phase so the tones do not all peak at the same time
+    frequencies = carrier_frequencies(carriers, sr, duration).reshape(-1, 1)
+    phases = np.pi * np.arange(2 * carriers).reshape(-1, 1) ** 2 / (2 * carriers)
+
+    # Share the amplitude between the carriers, the tones are sines as a sum of square waves would clip
+    templates = (amplitude / np.sqrt(carriers) * np.sin(2 * np.pi * frequencies * t + phases)).astype(dtype)
+
+    # The templates are shared between calls, so protect them from modification
+    templates.setflags(write=False)
+    return templates
 
 
-def encode_rs(binary_string, ecc_bytes):
+def carrier_symbols(symbols, carriers):
     """
-    This function encodes a binary string using Reed-Solomon encoding.
+    This function distributes symbols over parallel carriers.
 
     Parameters:
-    binary_string (str): The binary string.
-    ecc_bytes (int): The number of error correction bytes used in the encoding.
+    symbols (array): The symbols.
+    carriers (int): The number of carriers.
+
+    Returns:
+    array: A (n, carriers) array, row i holds the symbols sent at the same time during symbol period i.
+    """
+    # Pad the last row with valid Manchester pairs, the receiver drops the incomplete byte they form
+    padding = -len(symbols) % carriers
+    symbols = np.concatenate((symbols, np.arange(padding) % 2))
+
+    return symbols.reshape(-1, carriers)
+
+
+def modulate_carriers(symbols, duration=None, out=None):
+    """
+    This function converts symbols sent on parallel carriers to a signal.
+
+    Parameters:
+    symbols (array): A (n, carriers) array of symbols (0 selects the low frequency of a carrier, 1 the high frequency).
+    duration (float): The duration of one symbol, bit_duration if None.
+    out (array): An optional buffer the signal is written into, of length n * samples per symbol.
 
     Returns:
-    str: The encoded binary string.
+    array: The signal.
     """
-    # Convert the binary string to a bytearray
-    byte_data = bytearray(int(binary_string[i:i + 8], 2) for i in range(0, len(binary_string), 8))
+    if duration is None:
+        duration = profiles.bit_duration
+
+    n_symbols, carriers = symbols.shape
+    templates = carrier_templates(profiles.sample_rate, duration, carriers, profiles.amplitude_scaling_factor, filters.working_dtype)
 
-    # Initialize a Reed-Solomon codec
-    rs = reedsolo.RSCodec(ecc_bytes)
+    # Select the low or high tone of every carrier in every symbol period, in the type of the templates so the product is not upcast
+    selection = np.zeros((n_symbols, 2 * carriers), dtype=templates.dtype)
+    selection[np.arange(n_symbols)[:, None], np.arange(carriers) + carriers * symbols] = 1
 
-    # Encode the bytearray
-    encoded_data = rs.encode(byte_data)
+    if out is None:
+        # Sum the selected tones of every symbol period with a single matrix product
+        return (selection @ templates).reshape(-1)
 
-    # Convert the encoded bytearray back to a binary string
-    encoded_binary_string = ''.join(format(byte, '08b') for byte in encoded_data)
-    return encoded_binary_string
+    np.matmul(selection, templates, out=out.reshape(n_symbols, templates.shape[1]))
+    return out
 
 
-def manchester_encoding(binary_string):
+def encode_rs(bits, ecc_bytes):
     """
-    This function encodes a binary string using Manchester encoding.
+    This function encodes bits in blocks protected by Reed-Solomon encoding.
 
     Parameters:
-    binary_string (str): The binary string.
+    bits (array): The bits.
+    ecc_bytes (int): The number of error correction bytes of each block.
+
+    Returns:
+    array: The encoded bits.
+    """
+    # Pack the bits into bytes
+    byte_data = np.packbits(as_bits(bits)).tobytes()
+
+    # Split the bytes in blocks and encode each block
+    encoded_data = encode_blocks(byte_data, ecc_bytes)
+
+    # Unpack the encoded bytes back into bits
+    return np.unpackbits(np.frombuffer(encoded_data, dtype=np.uint8))
+
+
+def manchester_symbols(bits):
+    """
+    This function converts bits to their Manchester encoded symbols.
+
+    Parameters:
+    bits (array): The bits.
+
+    Returns:
+    array: The symbols, two per bit (0 becomes 01 and 1 becomes 10).
+    """
+    bits = as_bits(bits)
+
+    # Interleave each bit with its complement
+    return np.stack([bits, 1 - bits], axis=1).reshape(-1)
+
+
+def manchester_encoding(bits, out=None):
+    """
+    This function encodes bits using Manchester encoding.
+
+    Parameters:
+    bits (array): The bits.
+    out (array): An optional buffer the signal is written into.
 
     Returns:
     array: The Manchester encoded signal.
     """
-    # Encode the binary string using Reed-Solomon encoding
-    encode_binary_string = encode_rs(binary_string, 20)
+    # Encode the bits using Reed-Solomon encoding
+    encoded_bits = encode_rs(bits, profiles.ecc_bytes)
 
-    # Generate the time values for the signal
-    t = np.linspace(0, bit_duration, int(sample_rate * bit_duration), False)
-    signal = []
+    # Generate the whole Manchester encoded signal in one pass over the templates
+    return modulate(manchester_symbols(encoded_bits), out=out)
 
-    # For each bit in the encoded binary string, generate a Manchester encoded signal
-    for bit in tqdm(encode_binary_string, desc="Generating Signal"):
-        if bit == '0':
-            signal.append(amplitude_scaling_factor * np.sign(signal_function(low_frequency, t)))
-            signal.append(amplitude_scaling_factor * np.sign(signal_function(high_frequency, t)))
-        else:
-            signal.append(amplitude_scaling_factor * np.sign(signal_function(high_frequency, t)))
-            signal.append(amplitude_scaling_factor * np.sign(signal_function(low_frequency, t)))
 
-    return np.concatenate(signal)
+def header_symbols(carriers, profile=0):
+    """
+    This function returns the symbols of the frame header sent right after the start flag.
+
+    Parameters:
+    carriers (int): The number of carriers used for the payload.
+    profile (int): The profile the payload is sent with, 0 for the bit_duration and ecc_bytes parameters.
+
+    Returns:
+    array: The Manchester encoded header, always sent on the single low/high frequency pair at bit_duration.
+    """
+    if not 0 <= profile <= max_profile or not 1 <= carriers <= 15:
+        raise ValueError("The header holds a profile up to 15 and 1 to 15 carriers")
 
+    # The profile takes the 4 high bits and the number of carriers the 4 low bits
+    return manchester_symbols(np.unpackbits(np.array([profile << 4 | carriers], dtype=np.uint8)))
 
-def binary_to_signal(binary_string):
+
+def frame_to_signal(encoded_bits, carriers=1, profile=0):
     """
-    This function converts a binary string to a signal.
+    This function converts Reed-Solomon encoded bits to the signal of a whole frame.
 
     Parameters:
-    binary_string (str): The binary string.
+    encoded_bits (array): The Reed-Solomon encoded bits.
+    carriers (int): The number of parallel carriers the payload is sent on.
+    profile (int): The profile the payload is sent with, 0 for the bit_duration parameter.
+
+    Returns:
+    array: The signal.
+    """
+    duration = profile_settings(profile, carriers)[0]
+
+    # Compute the symbols first so the length of the whole signal is known
+    header = header_symbols(carriers, profile)
+    with metrics.stage('manchester_encode', bits=len(encoded_bits)):
+        symbols = manchester_symbols(encoded_bits)
+        if carriers > 1:
+            symbols = carrier_symbols(symbols, carriers)
+
+    # Compute the length of every part of the signal, the header keeps bit_duration so it is read before the profile is known
+    silence_length = int(profiles.sample_rate * profiles.silence_duration)
+    flag_length = 6 * int(profiles.sample_rate * profiles.flag_duration)
+    header_length = len(header) * int(profiles.sample_rate * profiles.bit_duration)
+    payload_length = len(symbols) * int(profiles.sample_rate * duration)
+
+    # Preallocate the signal, the silences before and after are left at zero
+    signal = np.zeros(2 * silence_length + 2 * flag_length + header_length + payload_length, dtype=filters.working_dtype)
+
+    # Write the start flag, the header, the Manchester encoded signal and the end flag in place
+    position = silence_length
+    flag_encoding(0, out=signal[position:position + flag_length])
+    position += flag_length
+    modulate(header, out=signal[position:position + header_length])
+    position += header_length
+    if carriers > 1:
+        modulate_carriers(symbols, duration, out=signal[position:position + payload_length])
+    else:
+        modulate(symbols, duration, out=signal[position:position + payload_length])
+    position += payload_length
+    flag_encoding(1, out=signal[position:position + flag_length])
+
+    return signal
+
+
+def binary_to_signal(bits, carriers=1, profile=0):
+    """
+    This function converts bits to a signal.
+
+    Parameters:
+    bits (array): The bits.
+    carriers (int): The number of parallel carriers the payload is sent on, ignored if a profile is given.
+    profile (int): The profile the payload is sent with, 0 for the bit_duration and ecc_bytes parameters.
 
     Returns:
     array: The signal.
     """
-    # Generate the start and end flags and the silence signals
-    flag_start = flag_encoding(0)
-    flag_end = flag_encoding(1)
-    silence_duration = 0.1
-    silence_before = generate_silence(silence_duration)
-    silence_after = generate_silence(silence_duration)
+    _, ecc, carriers = profile_settings(profile, carriers)
+
+    # Protect the bits with Reed-Solomon encoding
+    with metrics.stage('rs_encode', bytes=len(bits) // 8):
+        encoded_bits = encode_rs(bits, ecc)
 
-    # Concatenate the silence signals, the start and end flags, and the Manchester encoded signal into one signal
-    signal = np.concatenate([silence_before, flag_start, manchester_encoding(binary_string), flag_end, silence_after])
+    # Build the frame
+    with metrics.stage('synthesis') as fields:
+        signal = frame_to_signal(encoded_bits, carriers, profile)
+        fields['samples'] = len(signal)
+    metrics.count('samples_synthesized_total', len(signal))
 
     return signal
 
 
-def encode_and_generate_audio(text):
+def modem_parameters(carriers=1, profile=0):
+    """
+    This function lists the parameters that shape the signal of a frame, so signals rendered with other parameters are not reused.
+
+    Parameters:
+    carriers (int): The number of parallel carriers the payload is sent on.
+    profile (int): The profile the payload is sent with.
+
+    Returns:
+    tuple: The parameters.
+    """
+    # The header is always sent at the bit_duration parameter, whatever the profile
+    return (tuple(describe(profile, carriers).items()), profiles.bit_duration, filter_order, block_size,
+            np.dtype(filters.working_dtype).name)
+
+
+def encode(text, carriers=1, profile=0, compression=None):
+    """
+    This function encodes a text string into the filtered signal that is played to send it.
+    Signals are cached by content, so sending the same text again is a lookup.
+
+    Parameters:
+    text (str or bytes): The text string, or bytes to send a binary payload.
+    carriers (int): The number of parallel carriers the payload is sent on, ignored if a profile is given.
+    profile (int): The profile the payload is sent with, 0 for the bit_duration and ecc_bytes parameters.
+    compression (str): 'none', 'zlib', 'dictionary' or 'auto', the compression parameter of the payload module if None.
+
+    Returns:
+    array: The read-only filtered signal as int16 samples at the sample rate.
+    """
+    bits = payload_to_binary(text, compression)
+    metrics.count('bytes_encoded_total', len(bits) // 8)
+
+    # Reuse the signal if this payload was already rendered with the same parameters
+    key = waveform_key(np.packbits(bits).tobytes(), modem_parameters(carriers, profile))
+    cached = lookup(key)
+    metrics.count('waveform_cache_total', result='miss' if cached is None else 'hit')
+    if cached is not None:
+        return cached
+
+    # Convert the binary string to a signal
+    signal = binary_to_signal(bits, carriers, profile)
+
+    # Apply the bandpass filter to the signal
+    filtered_signal = butter_bandpass_filter(signal, profiles.sample_rate, profiles.filter_band)
+
+    # The filtered signal is not used afterwards, round and saturate it in place
+    return store(key, to_int16(filtered_signal, overwrite=True))
+
+
+def encode_adaptive(text, snr_db):
     """
-    This function encodes a text string into a binary string, converts the binary string to a signal, and writes the signal to an audio file.
+    This function encodes a text string with the fastest profile that decodes reliably at the SNR the receiver measured.
 
     Parameters:
     text (str): The text string.
+    snr_db (float): The SNR reported by the receiver, the lowest of its bands.
 
     Returns:
-    str: A success message if the audio file is generated correctly, otherwise an error message.
+    array: The read-only filtered signal as int16 samples at the sample rate.
     """
-    try:
-        # Delete the input and output files if they exist
-        delete_file(input_file)
-        delete_file(output_file)
+    return encode(text, profile=select_profile(snr_db))
+
+
+def profile_number(name):
+    """
+    This function finds a profile from the name chosen in the interface.
+
+    Parameters:
+    name (str): The name of the profile, "Custom" for the parameters.
+
+    Returns:
+    int: The profile, 0 for "Custom".
+    """
+    names = {settings['name']: number for number, settings in profile_table.items()}
+    return names.get(name, 0)
+
 
-        # Convert the text to a binary string
-        binary_string_to_send = text_to_binary(text)
+def encode_and_generate_audio(text, carriers=1, profile="Custom"):
+    """
+    This function encodes a text string into a signal and writes the signal to an audio file.
 
-        # Convert the binary string to a signal
-        signal = binary_to_signal(binary_string_to_send)
+    Parameters:
+    text (str): The text string.
+    carriers (int): The number of parallel carriers the payload is sent on, used by the "Custom" profile.
+    profile (str): The name of the profile, "Custom" for the parameters and the number of carriers.
 
-        # Write the signal to an audio file
-        write('output_text.wav', 44100, signal.astype(np.int16))
+    Returns:
+    str: A success message if the audio file is generated correctly, otherwise an error message.
+    """
+    try:
+        # Delete the output file if it exists
+        delete_file(output_file)
 
-        # Apply the bandpass filter to the audio data and write the filtered data to an output file
-        filtered()
+        # Write the encoded signal to the audio file
+        signal = encode(text, int(carriers), profile_number(profile))
+        with metrics.stage('wav_write', samples=len(signal)):
+            write(output_file, profiles.sample_rate, signal)
 
         return "WAV file generated and ready to be sent."
     except Exception as e:
@@ -329,21 +561,82 @@ def encode_and_generate_audio(text):
         return f"Error: {str(e)}"
 
 
+# -----------------Profiles----------------- #
+
+def prepare():
+    """
+    This function computes once what sending with every profile needs: the symbol templates and the Reed-Solomon codecs.
+    Worker processes started afterwards inherit them instead of computing them for their first frame.
+
+    Returns:
+    None
+    """
+    dtype = filters.working_dtype
+    symbol_templates(profiles.sample_rate, profiles.flag_duration, profiles.amplitude_scaling_factor, dtype)
+    symbol_templates(profiles.sample_rate, profiles.bit_duration, profiles.amplitude_scaling_factor, dtype)
+
+    for profile in [0] + list(profile_table):
+        duration, ecc, carriers = profile_settings(profile)
+        if carriers > 1:
+            carrier_templates(profiles.sample_rate, duration, carriers, profiles.amplitude_scaling_factor, dtype)
+        else:
+            symbol_templates(profiles.sample_rate, duration, profiles.amplitude_scaling_factor, dtype)
+        rs_codec(ecc)
+
+
 # -----------------Player----------------- #
 
-def play_sound():
-    return gr.Audio(output_file, autoplay=True)
+def generate_audio(text, carriers=1, profile="Custom"):
+    """
+    This function encodes a text string into the audio played by the interface.
+    The audio is returned instead of written to output_file, so the requests of several users never share a file.
+
+    Parameters:
+    text (str): The text string.
+    carriers (int): The number of parallel carriers the payload is sent on, used by the "Custom" profile.
+    profile (str): The name of the profile, "Custom" for the parameters and the number of carriers.
+
+    Returns:
+    tuple: A message, and the sample rate with the int16 samples, or None if an error occurs.
+    """
+    try:
+        signal = encode(text, int(carriers), profile_number(profile))
+        return "Audio generated and ready to be sent.", (profiles.sample_rate, signal)
+    except Exception as e:
+        # If an error occurs, return an error message
+        return f"Error: {str(e)}", None
 
 
 # -----------------Interface-----------------#
 
-# Start a Gradio Blocks interface
-with gr.Blocks() as demo:
-    name = gr.Textbox(label="Your Text")
-    output = gr.Textbox(label="Output")
-    submit = gr.Button("Generate Audio")
-    submit.click(fn=encode_and_generate_audio, inputs=name, outputs=output)
-
-    gr.Interface(fn=play_sound, inputs=[], outputs=gr.Audio(), live=False)
+def interface():
+    """
+    This function builds the Gradio interface of the sender.
 
-demo.launch()
+    Returns:
+    Blocks: The interface, ready to be launched.
+    """
+    # Import gradio here so encoding without the interface does not load it
+    import gradio as gr
+    from async_api import offloaded
+
+    # Start a Gradio Blocks interface
+    with gr.Blocks() as demo:
+        name = gr.Textbox(label="Your Text")
+        carriers = gr.Slider(1, max_carriers(profiles.sample_rate, profiles.bit_duration), value=1, step=1, label="Carriers")
+        profile = gr.Dropdown(["Custom"] + [settings['name'] for settings in profile_table.values()], value="Custom",
+                              label="Profile")
+        output = gr.Textbox(label="Output")
+        submit = gr.Button("Generate Audio")
+        audio = gr.Audio(label="Audio", autoplay=True)
+        submit.click(fn=offloaded(generate_audio), inputs=[name, carriers, profile], outputs=[output, audio])
+
+    # The signal processing runs in a pool and every request keeps its audio in memory, so the handlers of many users
+    # can run at the same time
+    demo.queue(default_concurrency_limit=None)
+    return demo
+
+
+if __name__ == '__main__':
+    metrics.verbose = True
+    interface().launch()
@@ -0,0 +1,412 @@
+import io
+import os
+import json
+import base64
+import queue
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from scipy.io.wavfile import read, write
+import sender
+import receiver
+import profiles
+import payload
+import metrics
+from profiles import profile_table
+
+# ---------------Parameters--------------- #
+
+host = '127.0.0.1'
+port = 8000
+
+# At most max_jobs payloads are queued or running, new ones wait submit_timeout seconds for a free slot
+max_jobs = 256
+submit_timeout = 1.0
+max_request_bytes = 64 * 1024 * 1024
+
+# Payloads of a batch are sent to the workers in chunks, a few per worker, to pay for the transfers
+chunks_per_worker = 4
+
+executor = None
+slots = None
+capacity = None
+n_workers = None
+lock = threading.Lock()
+
+
+# -----------------Jobs----------------- #
+
+def encode_job(text, carriers=1, profile=0, compression=None):
+    """
+    This function encodes a text string into a WAV file held in memory.
+
+    Parameters:
+    text (str): The text string.
+    carriers (int): The number of parallel carriers the payload is sent on, ignored if a profile is given.
+    profile (int): The profile the payload is sent with, 0 for the bit_duration and ecc_bytes parameters.
+    compression (str): 'none', 'zlib', 'dictionary' or 'auto', the compression parameter of the payload module if None.
+
+    Returns:
+    bytes: The content of the WAV file.
+    """
+    signal = sender.encode(text, carriers, profile, compression)
+    buffer = io.BytesIO()
+    with metrics.stage('wav_write', samples=len(signal)):
+        write(buffer, profiles.sample_rate, signal)
+    return buffer.getvalue()
+
+
+def decode_job(wav):
+    """
+    This function decodes the text sent in a WAV file held in memory.
+
+    Parameters:
+    wav (bytes): The content of the WAV file.
+
+    Returns:
+    str: The received text.
+    """
+    with metrics.stage('wav_read', bytes=len(wav)):
+        sr, data = read(io.BytesIO(wav))
+    metrics.count('samples_read_total', len(data))
+    return receiver.decode(data, sr)
+
+
+def run_jobs(function, jobs):
+    """
+    This function runs a chunk of jobs in a worker, a failed job does not stop the others.
+
+    Parameters:
+    function (callable): The job function.
+    jobs (list): The arguments of every job.
+
+    Returns:
+    tuple: A dict per job, with the result under 'result' or the error message under 'error', and the metrics of the chunk.
+    """
+    results = []
+    for args in jobs:
+        try:
+            results.append({'result': function(*args)})
+        except Exception as e:
+            results.append({'error': str(e)})
+            metrics.count('jobs_failed_total', job=function.__name__)
+    metrics.count('jobs_total', len(jobs), job=function.__name__)
+    return results, metrics.collect()
+
+
+# -----------------Pool----------------- #
+
+def start(workers=None, queue_size=max_jobs):
+    """
+    This function starts the worker processes and the job queue.
+
+    Parameters:
+    workers (int): The number of processes, one per core if None.
+    queue_size (int): The number of payloads that can be queued or running at the same time.
+
+    Returns:
+    None
+    """
+    global executor, slots, capacity, n_workers
+    with lock:
+        if executor is None:
+            n_workers = workers or os.cpu_count() or 1
+
+            # Compute what every profile needs before the workers are forked, so they inherit it
+            sender.prepare()
+            receiver.prepare()
+            executor = ProcessPoolExecutor(max_workers=n_workers)
+            slots = threading.BoundedSemaphore(queue_size)
+            capacity = queue_size
+
+
+def restart(broken):
+    """
+    This function drops a pool whose worker died, so the next batch starts a new one.
+
+    Parameters:
+    broken (ProcessPoolExecutor): The pool that broke.
+
+    Returns:
+    None
+    """
+    global executor
+    with lock:
+        # Another request may have replaced the pool already
+        if executor is broken:
+            executor.shutdown(wait=False)
+            executor = None
+            metrics.count('pool_restarts_total')
+
+
+def stop():
+    """
+    This function waits for the running jobs and stops the worker processes.
+
+    Returns:
+    None
+    """
+    global executor
+    with lock:
+        if executor is not None:
+            executor.shutdown()
+            executor = None
+
+
+def acquire(count, timeout=submit_timeout):
+    """
+    This function reserves room in the queue for payloads, so the service slows its clients down instead of piling up work.
+
+    Parameters:
+    count (int): The number of payloads.
+    timeout (float): The number of seconds to wait for room.
+
+    Returns:
+    None
+    """
+    # A batch larger than the queue would never fit, waiting would not help
+    if count > capacity:
+        raise ValueError(f"A batch holds at most {capacity} payloads")
+
+    acquired = 0
+    try:
+        for _ in range(count):
+            if not slots.acquire(timeout=timeout):
+                raise queue.Full("The job queue is full, try again later")
+            acquired += 1
+    except queue.Full:
+        for _ in range(acquired):
+            slots.release()
+        raise
+
+
+def release(count):
+    """
+    This function frees the room of finished payloads in the queue.
+
+    Parameters:
+    count (int): The number of payloads.
+
+    Returns:
+    None
+    """
+    for _ in range(count):
+        slots.release()
+
+
+def run_batch(function, jobs, timeout=submit_timeout):
+    """
+    This function runs many jobs across the worker processes and waits for all of them.
+
+    Parameters:
+    function (callable): The job function.
+    jobs (list): The arguments of every job.
+    timeout (float): The number of seconds to wait for room in the queue.
+
+    Returns:
+    list: A dict per job, in order, with the result under 'result' or the error message under 'error'.
+    """
+    start()
+    acquire(len(jobs), timeout)
+
+    # Split the batch in chunks, enough to keep every worker busy
+    chunk_size = max(1, -(-len(jobs) // (n_workers * chunks_per_worker)))
+    chunks = [jobs[first:first + chunk_size] for first in range(0, len(jobs), chunk_size)]
+
+    pool = executor
+    futures = []
+    try:
+        try:
+            for chunk in chunks:
+                future = pool.submit(run_jobs, function, chunk)
+                future.add_done_callback(lambda _, count=len(chunk): release(count))
+                futures.append(future)
+        except Exception:
+            # Free the room of the chunks that could not be submitted
+            release(sum(len(chunk) for chunk in chunks[len(futures):]))
+            raise
+
+        # Bring the metrics of every chunk back from the worker processes
+        results = []
+        for future in futures:
+            chunk_results, collected = future.result()
+            metrics.merge(collected)
+            results.extend(chunk_results)
+        return results
+    except BrokenProcessPool:
+        # A worker died and took the jobs of the whole pool with it, the next batch gets a new pool
+        restart(pool)
+        raise
+
+
+def encode_batch(texts, carriers=1, profile=0, compression=None):
+    """
+    This function encodes many text strings in parallel.
+
+    Parameters:
+    texts (list): The text strings.
+    carriers (int): The number of parallel carriers the payloads are sent on, ignored if a profile is given.
+    profile (int or str): The profile number or name the payloads are sent with, 0 for the default settings.
+    compression (str): 'none', 'zlib', 'dictionary' or 'auto', the compression parameter of the payload module if None.
+
+    Returns:
+    list: A dict per text, with the content of its WAV file under 'result' or the error message under 'error'.
+    """
+    # Check the options once for the whole batch, rather than failing every payload with the same error
+    names = {settings['name']: number for number, settings in profile_table.items()}
+    profile = names[profile] if profile in names else int(profile)
+    if profile and profile not in profile_table:
+        raise ValueError(f"Unknown profile {profile}")
+    if compression is not None and compression != 'auto' and compression not in payload.methods:
+        raise ValueError(f"Unknown compression {compression}")
+
+    return run_batch(encode_job, [(text, carriers, profile, compression) for text in texts])
+
+
+def decode_batch(wavs):
+    """
+    This function decodes many WAV files in parallel.
+
+    Parameters:
+    wavs (list): The contents of the WAV files.
+
+    Returns:
+    list: A dict per file, with the received text under 'result' or the error message under 'error'.
+    """
+    return run_batch(decode_job, [(wav,) for wav in wavs])
+
+
+# -----------------HTTP----------------- #
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    This class answers the batch endpoints of the service:
+    POST /encode with {"texts": [...], "carriers": 1, "profile": 0, "compression": "auto"} returns {"results": [{"audio": base64 WAV} or {"error": ...}]},
+    POST /decode with {"audio": [base64 WAV, ...]} returns {"results": [{"text": ...} or {"error": ...}]},
+    GET /metrics returns the metrics of the service in the Prometheus text format, GET /metrics.json as JSON.
+    """
+
+    def send_json(self, status, body):
+        """
+        This function sends a JSON response.
+
+        Parameters:
+        status (int): The HTTP status code.
+        body (dict): The body of the response.
+
+        Returns:
+        None
+        """
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        if status == 503:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        """
+        This function answers a metrics request.
+
+        Returns:
+        None
+        """
+        if self.path == '/metrics.json':
+            self.send_json(200, metrics.snapshot())
+            return
+        if self.path != '/metrics':
+            self.send_json(404, {'error': f"Unknown endpoint {self.path}"})
+            return
+
+        content = metrics.prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_POST(self):
+        """
+        This function answers a batch request.
+
+        Returns:
+        None
+        """
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > max_request_bytes:
+            self.send_json(413, {'error': f"Requests are limited to {max_request_bytes} bytes"})
+            return
+
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+            if self.path == '/encode':
+                results = encode_batch([str(text) for text in request['texts']], int(request.get('carriers', 1)),
+                                       request.get('profile', 0), request.get('compression'))
+                key, convert = 'audio', lambda wav: base64.b64encode(wav).decode('ascii')
+            elif self.path == '/decode':
+                results = decode_batch([base64.b64decode(wav) for wav in request['audio']])
+                key, convert = 'text', lambda text: text
+            else:
+                self.send_json(404, {'error': f"Unknown endpoint {self.path}"})
+                return
+        except queue.Full as e:
+            self.send_json(503, {'error': str(e)})
+            return
+        except BrokenProcessPool:
+            self.send_json(503, {'error': "A worker process stopped, try again"})
+            return
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {'error': f"Invalid request: {e}"})
+            return
+
+        self.send_json(200, {'results': [{key: convert(result['result'])} if 'result' in result else result
+                                         for result in results]})
+
+
+def serve(address=host, server_port=port, workers=None, queue_size=max_jobs):
+    """
+    This function runs the service until it is interrupted.
+
+    Parameters:
+    address (str): The address to listen on.
+    server_port (int): The port to listen on.
+    workers (int): The number of worker processes, one per core if None.
+    queue_size (int): The number of payloads that can be queued or running at the same time.
+
+    Returns:
+    None
+    """
+    start(workers, queue_size)
+    server = ThreadingHTTPServer((address, server_port), Handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        stop()
+
+
+def main():
+    """
+    This function starts the service from the command line.
+
+    Returns:
+    None
+    """
+    parser = argparse.ArgumentParser(description="Encode and decode batches of messages over HTTP with a pool of worker processes.")
+    parser.add_argument('--host', default=host, help="address to listen on")
+    parser.add_argument('--port', type=int, default=port, help="port to listen on")
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes")
+    parser.add_argument('--queue-size', type=int, default=max_jobs, help="payloads queued or running at the same time")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.workers, args.queue_size)
+
+
+if __name__ == '__main__':
+    main()
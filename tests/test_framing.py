@@ -0,0 +1,44 @@
+import os
+import numpy as np
+import pytest
+import framing
+
+
+def test_round_trip():
+    # Several blocks, the last one shorter, and an empty payload
+    for data in (os.urandom(3 * framing.block_size + 17), b''):
+        assert framing.decode_blocks(framing.encode_blocks(data, 16), 16, workers=1) == (data, [])
+
+
+def test_erasures():
+    data = os.urandom(2 * framing.block_size)
+    encoded = bytearray(framing.encode_blocks(data, 16))
+
+    # Corrupt more bytes of the first block than Reed-Solomon corrects as errors, but mark them unreliable
+    confidence = np.ones(len(encoded))
+    positions = np.arange(5, 5 + 12)
+    for position in positions:
+        encoded[position] ^= 0xFF
+    assert framing.decode_blocks(encoded, 16, workers=1)[1] == [0]
+
+    confidence[positions] = 0.0
+    assert framing.decode_blocks(encoded, 16, workers=1, confidence=confidence) == (data, [])
+
+
+def test_lost_block():
+    data = os.urandom(3 * framing.block_size)
+    encoded = bytearray(framing.encode_blocks(data, 16))
+
+    # A block corrupted beyond repair is reported by its sequence number, the others are still decoded
+    length = framing.block_length(16)
+    encoded[length:length + 40] = bytes(40)
+    decoded, missing = framing.decode_blocks(encoded, 16, workers=1)
+    assert missing == [1]
+    assert decoded == data[:framing.block_size] + data[2 * framing.block_size:]
+
+
+def test_too_many_blocks(monkeypatch):
+    monkeypatch.setattr(framing, 'max_blocks', 2)
+    framing.encode_blocks(bytes(2 * framing.block_size), 16)
+    with pytest.raises(ValueError):
+        framing.encode_blocks(bytes(2 * framing.block_size + 1), 16)
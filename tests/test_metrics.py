@@ -0,0 +1,44 @@
+import pytest
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def empty():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_export():
+    metrics.count('frames_total', 2, result='ok')
+    for value in (0.65, 0.75, 0.999):
+        metrics.observe('sync_confidence', value)
+
+    snapshot = metrics.snapshot()
+    assert snapshot['counters'] == {'acoustic_frames_total{result="ok"}': 2}
+    histogram = snapshot['histograms']['acoustic_sync_confidence']
+    assert histogram['count'] == 3
+    assert histogram['sum'] == pytest.approx(2.399)
+
+    # Buckets are cumulative in both exports
+    assert histogram['buckets']['0.6'] == 0
+    assert histogram['buckets']['0.7'] == 1
+    assert histogram['buckets']['0.99'] == 2
+    assert histogram['buckets']['+Inf'] == 3
+
+    lines = metrics.prometheus().splitlines()
+    assert '# TYPE acoustic_frames_total counter' in lines
+    assert 'acoustic_frames_total{result="ok"} 2' in lines
+    assert 'acoustic_sync_confidence_bucket{le="0.7"} 1' in lines
+    assert 'acoustic_sync_confidence_bucket{le="+Inf"} 3' in lines
+    assert 'acoustic_sync_confidence_count 3' in lines
+
+
+def test_merge():
+    metrics.count('jobs_total', 1)
+    collected = metrics.collect()
+    assert metrics.snapshot()['counters'] == {}
+
+    metrics.merge(collected)
+    metrics.merge(collected)
+    assert metrics.snapshot()['counters'] == {'acoustic_jobs_total': 2}
@@ -0,0 +1,37 @@
+import pytest
+import payload
+
+text = "Hello, please call me back tomorrow morning. " * 4
+
+
+def test_compress_round_trip():
+    for method in ('zlib', 'dictionary'):
+        compressed = payload.compress(text.encode(), method)
+        assert len(compressed) < len(text)
+        assert payload.decompress(compressed, method) == text.encode()
+
+
+def test_pack_round_trip():
+    for method in ('none', 'zlib', 'dictionary', 'auto'):
+        assert payload.unpack(payload.pack(text.encode(), True, method)) == (text.encode(), True)
+    assert payload.unpack(payload.pack(bytes(range(256)), False, 'auto')) == (bytes(range(256)), False)
+
+
+def test_truncated():
+    for method in ('zlib', 'dictionary'):
+        compressed = payload.compress(text.encode(), method)
+        with pytest.raises(ValueError):
+            payload.decompress(compressed[:-2], method)
+        with pytest.raises(ValueError):
+            payload.unpack(payload.pack(text.encode(), True, method)[:-2])
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        payload.pack(b'data', method='lzma')
+    with pytest.raises(ValueError):
+        payload.unpack(b'')
+    with pytest.raises(ValueError):
+        payload.unpack(bytes([0x0F]) + b'data')
+    with pytest.raises(ValueError):
+        payload.decompress(b'not deflate', 'zlib')
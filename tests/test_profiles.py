@@ -0,0 +1,18 @@
+import profiles
+from profiles import profile_table, select_profile
+
+
+def test_select_profile():
+    # A low SNR falls back to the most robust profile, a high one gets the fastest
+    assert select_profile(-10.0) == 1
+    assert select_profile(100.0) == 5
+
+    # Every profile is picked once the SNR reaches its minimum and the margin
+    for profile, settings in profile_table.items():
+        chosen = select_profile(settings['min_snr_db'] + profiles.snr_margin)
+        assert profiles.payload_rate(chosen) >= profiles.payload_rate(profile)
+
+
+def test_profile_settings():
+    assert profiles.profile_settings(0, 3) == (profiles.bit_duration, profiles.ecc_bytes, 3)
+    assert profiles.profile_settings(3)[2] == profile_table[3]['carriers']
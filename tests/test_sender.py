@@ -0,0 +1,13 @@
+import sender
+import receiver
+from scipy.io.wavfile import read
+
+
+def test_encode_and_generate_audio(tmp_path, monkeypatch):
+    # Run the handler of the sender interface for the custom settings and a profile, and decode what it wrote
+    monkeypatch.setattr(sender, 'output_file', str(tmp_path / 'output.wav'))
+
+    for profile in ("Custom", "fast"):
+        assert sender.encode_and_generate_audio("Hello", 1, profile) == "WAV file generated and ready to be sent."
+        sr, data = read(sender.output_file)
+        assert receiver.decode(data, sr) == "Hello"
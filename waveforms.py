@@ -0,0 +1,137 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# ---------------Parameters--------------- #
+
+# Rendered waveforms are kept in memory up to memory_limit bytes, the least recently used are dropped first
+enabled = True
+memory_limit = 64 * 1024 * 1024
+
+# Waveforms are also written as .npy files in this directory if set, here or with the ACOUSTIC_WAVEFORM_CACHE environment variable
+disk_dir = os.environ.get('ACOUSTIC_WAVEFORM_CACHE') or None
+
+# Change the version when the rendering changes in a way the modem parameters do not capture
+version = 1
+
+memory = OrderedDict()
+memory_size = 0
+lock = threading.Lock()
+
+
+# -----------------Keys----------------- #
+
+def waveform_key(payload, parameters):
+    """
+    This function computes the content address of a rendered waveform.
+
+    Parameters:
+    payload (bytes): The payload.
+    parameters (tuple): The modem parameters the waveform is rendered with.
+
+    Returns:
+    str: The hexadecimal SHA-256 of the payload and the parameters.
+    """
+    digest = hashlib.sha256()
+    digest.update(repr((version, parameters)).encode('utf-8'))
+    digest.update(payload)
+    return digest.hexdigest()
+
+
+def disk_path(key):
+    """
+    This function returns the file a waveform is stored in on disk.
+
+    Parameters:
+    key (str): The content address of the waveform.
+
+    Returns:
+    str: The path of the .npy file.
+    """
+    return os.path.join(disk_dir, key[:2], key + '.npy')
+
+
+# -----------------Cache----------------- #
+
+def lookup(key):
+    """
+    This function looks a waveform up in memory, then on disk.
+
+    Parameters:
+    key (str): The content address of the waveform.
+
+    Returns:
+    array: The read-only waveform, memory-mapped if it comes from disk, or None if it is not cached.
+    """
+    if not enabled:
+        return None
+
+    with lock:
+        waveform = memory.get(key)
+        if waveform is not None:
+            memory.move_to_end(key)
+            return waveform
+
+    if disk_dir is not None:
+        try:
+            return np.load(disk_path(key), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+    return None
+
+
+def store(key, waveform):
+    """
+    This function caches a waveform in memory and, if the disk tier is on, on disk.
+
+    Parameters:
+    key (str): The content address of the waveform.
+    waveform (array): The waveform.
+
+    Returns:
+    array: The waveform, made read-only as it is now shared.
+    """
+    global memory_size
+    waveform.setflags(write=False)
+    if not enabled:
+        return waveform
+
+    # Keep the waveform in memory unless it would not fit at all
+    if waveform.nbytes <= memory_limit:
+        with lock:
+            if key not in memory:
+                memory[key] = waveform
+                memory_size += waveform.nbytes
+
+            # Drop the least recently used waveforms until the others fit
+            while memory_size > memory_limit:
+                _, dropped = memory.popitem(last=False)
+                memory_size -= dropped.nbytes
+
+    if disk_dir is not None:
+        path = disk_path(key)
+        if not os.path.exists(path):
+            # Write to a temporary file first so readers never see a partial file
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary, 'wb') as file:
+                np.save(file, waveform)
+            os.replace(temporary, path)
+
+    return waveform
+
+
+def clear():
+    """
+    This function empties the memory tier. Files on disk are kept.
+
+    Returns:
+    None
+    """
+    global memory_size
+    with lock:
+        memory.clear()
+        memory_size = 0